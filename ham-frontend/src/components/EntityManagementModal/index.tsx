@@ -31,7 +31,8 @@ export function EntityManagementModal({
     useEvent<TrackedEntity>(
         `entity.tracking.${entity.id}`,
         `entity.tracked.${entity.id}`,
-        setTracking
+        setTracking,
+        `entity.tracked:${entity.id}`
     );
 
     const [panel, setPanel] = useState<string[]>(["fields"]);
@@ -28,6 +28,14 @@ import { useApi } from "../../util/api/func";
 import { BasicState } from "../../util/events";
 import { ValueRenderer } from "../entities/entityUtils";
 
+const RETENTION_OPTIONS = [
+    { value: "", label: "Keep Forever" },
+    { value: String(86400), label: "1 Day" },
+    { value: String(7 * 86400), label: "1 Week" },
+    { value: String(30 * 86400), label: "30 Days" },
+    { value: String(365 * 86400), label: "1 Year" },
+];
+
 function FieldTypeInput({
     field,
     type,
@@ -219,18 +227,38 @@ export function EntityValue({
                         </Title>
                     </Group>
                     {trackedValue?.logging ? (
-                        <Button
-                            variant="subtle"
-                            color="red"
-                            leftIcon={<MdBarChart size={20} />}
-                            onClick={() =>
-                                del<null>(
-                                    `/ha/entities/tracked/${entity.id}/values/${field}/logging`
-                                )
-                            }
-                        >
-                            Stop Logging
-                        </Button>
+                        <Group spacing="sm">
+                            <Select
+                                size="xs"
+                                value={String(trackedValue.retention ?? "")}
+                                onChange={(value) =>
+                                    post<null>(
+                                        `/ha/entities/tracked/${entity.id}/values/${field}/retention`,
+                                        {
+                                            data: {
+                                                retention: value
+                                                    ? Number(value)
+                                                    : null,
+                                            },
+                                        }
+                                    )
+                                }
+                                data={RETENTION_OPTIONS}
+                                aria-label="Raw Data Retention"
+                            />
+                            <Button
+                                variant="subtle"
+                                color="red"
+                                leftIcon={<MdBarChart size={20} />}
+                                onClick={() =>
+                                    del<null>(
+                                        `/ha/entities/tracked/${entity.id}/values/${field}/logging`
+                                    )
+                                }
+                            >
+                                Stop Logging
+                            </Button>
+                        </Group>
                     ) : (
                         <Button
                             variant="subtle"
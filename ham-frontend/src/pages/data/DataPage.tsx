@@ -9,7 +9,7 @@ import {
     Title,
     Tooltip,
 } from "@mantine/core";
-import { useEvent } from "../../util/events";
+import { useEvent, useResync } from "../../util/events";
 import "./views.scss";
 import { MdAdd } from "react-icons/md";
 import { CreateViewModal } from "./CreateViewModal";
@@ -39,6 +39,7 @@ export function DataPage() {
     const [creating, setCreating] = useState(false);
     const [views, setViews] = useState<View[]>([]);
     const { get } = useApi();
+    const resync = useResync();
 
     const loadViews = useCallback(
         () =>
@@ -51,7 +52,7 @@ export function DataPage() {
     useEvent<{ id: string }>("view-listener", "views", loadViews);
     useEffect(() => {
         loadViews();
-    }, []);
+    }, [resync]);
 
     return (
         <Box className="data-views">
@@ -1,52 +1,127 @@
 import { memo, useCallback, useEffect, useMemo, useState } from "react";
-import { DataEntry, View } from "../../types/data";
+import {
+    View,
+    ViewBins,
+    ViewColumns,
+    ViewDataEvent,
+    ViewSeries,
+} from "../../types/data";
 import { useApi } from "../../util/api/func";
-import { useEvent } from "../../util/events";
+import { useEvent, useResync } from "../../util/events";
 import { ResponsiveLine } from "@nivo/line";
-import { Box, useMantineTheme } from "@mantine/core";
+import { Box, SegmentedControl, useMantineTheme } from "@mantine/core";
+import { useElementSize } from "@mantine/hooks";
 import { useColorMode } from "../../util/colorMode";
-import { guessTimeUnit } from "./util";
+import {
+    appendRows,
+    decodeColumns,
+    findSeries,
+    guessTimeUnit,
+    viewWindowStart,
+} from "./util";
 import { ResponsiveBar } from "@nivo/bar";
 
-function useData(view: View): DataEntry[] {
-    const [data, setData] = useState<DataEntry[]>([]);
+// Linear views request about one point per pixel of graph width, rounded so
+// small resizes don't trigger a reload.
+function pointsForWidth(view: View, width: number): number | null {
+    if (view.type !== "linear" || width <= 0) {
+        return null;
+    }
+    return Math.max(Math.ceil(width / 100) * 100, 100);
+}
+
+function useData(view: View, width: number): ViewSeries[] {
+    const [data, setData] = useState<ViewSeries[]>([]);
     const { get } = useApi();
+    const points = pointsForWidth(view, width);
+    const resync = useResync();
     const loadData = useCallback(() => {
-        get<DataEntry[]>(`/views/${view.id}/data`).then(
-            (result) => result.success && setData(result.value)
+        if (view.type !== "linear" || points === null) {
+            return;
+        }
+        get<ViewColumns[]>(`/views/${view.id}/data`, {
+            urlParams: {
+                format: "columns",
+                ...(points ? { points: points.toString() } : {}),
+            },
+        }).then(
+            (result) => result.success && setData(decodeColumns(result.value))
         );
-    }, [view.id]);
-    useEvent<string[]>(`data-listener-${view.id}`, "data", loadData);
+    }, [view.id, view.type, points]);
+    const appendData = useCallback(
+        (event: ViewDataEvent) => {
+            if (view.type === "linear" && event.view === view.id) {
+                setData((current) =>
+                    appendRows(current, event.rows, viewWindowStart(view))
+                );
+            }
+        },
+        [view]
+    );
+    useEvent<ViewDataEvent>(
+        `data-listener-${view.id}`,
+        "view_data",
+        appendData,
+        `view_data:${view.id}`
+    );
 
-    useEffect(() => loadData(), []);
+    useEffect(() => loadData(), [loadData, resync]);
 
     return data;
 }
 
-type GraphTypeProps = {
-    data: DataEntry[];
+function useBins(view: View): ViewBins[] {
+    const [bins, setBins] = useState<ViewBins[]>([]);
+    const { get } = useApi();
+    const resync = useResync();
+    const loadBins = useCallback(() => {
+        if (view.type !== "frequency") {
+            return;
+        }
+        get<ViewBins[]>(`/views/${view.id}/data`, {
+            urlParams: { format: "bins" },
+        }).then((result) => result.success && setBins(result.value));
+    }, [view.id, view.type]);
+    const reloadBins = useCallback(
+        (event: ViewDataEvent) => event.view === view.id && loadBins(),
+        [view.id, loadBins]
+    );
+    useEvent<ViewDataEvent>(
+        `bins-listener-${view.id}`,
+        "view_data",
+        reloadBins,
+        `view_data:${view.id}`
+    );
+
+    useEffect(() => loadBins(), [loadBins, resync]);
+
+    return bins;
+}
+
+type LinearGraphProps = {
+    data: ViewSeries[];
     view: View;
 };
 
-const GraphTypeLinear = memo(({ data, view }: GraphTypeProps) => {
+const GraphTypeLinear = memo(({ data, view }: LinearGraphProps) => {
     const [mode] = useColorMode();
     const theme = useMantineTheme();
     const transformedData = useMemo(() => {
-        return view.fields.map((field) => ({
-            id: field.name,
-            color: field.color,
-            data: data
-                .filter(
-                    (entry) =>
-                        entry.entity === field.entity &&
-                        entry.field === field.field &&
-                        !isNaN(Number(entry.value))
-                )
-                .map((entry) => ({
-                    x: new Date(entry.time * 1000),
-                    y: Number(entry.value),
-                })),
-        }));
+        return view.fields.map((field) => {
+            const series = findSeries(data, field);
+            return {
+                id: field.name,
+                color: field.color,
+                data: series
+                    ? series.times
+                          .map((time, index) => ({
+                              x: new Date(time),
+                              y: Number(series.values[index]),
+                          }))
+                          .filter((point) => !isNaN(point.y))
+                    : [],
+            };
+        });
     }, [data, view.fields]);
 
     return (
@@ -100,102 +175,116 @@ const GraphTypeLinear = memo(({ data, view }: GraphTypeProps) => {
     );
 });
 
-const GraphTypeFrequency = memo(({ data, view }: GraphTypeProps) => {
+type FrequencyMeasure = "durations" | "counts";
+
+type FrequencyGraphProps = {
+    bins: ViewBins[];
+    view: View;
+};
+
+const GraphTypeFrequency = memo(({ bins, view }: FrequencyGraphProps) => {
     const [mode] = useColorMode();
     const theme = useMantineTheme();
+    const [measure, setMeasure] = useState<FrequencyMeasure>("durations");
     const transformedData: any[] = useMemo(() => {
-        const fields: { [key: string]: [string, string] } = view.fields.reduce(
-            (previous, current) => ({
-                ...previous,
-                [current.entity + ":" + current.field]: [
-                    current.name,
-                    current.color,
-                ],
-            }),
-            {}
-        );
-        return Object.values(
-            data.reduce(
-                (previous, current) => ({
-                    ...previous,
-                    [current.value.toString().toLowerCase()]: {
-                        ...(previous[current.value.toString().toLowerCase()] ??
-                            {}),
-                        key: current.value.toString().toLowerCase(),
-                        [fields[current.entity + ":" + current.field][0]]:
-                            ((previous[
-                                current.value.toString().toLowerCase()
-                            ] ?? {})[
-                                fields[current.entity + ":" + current.field][0]
-                            ] ?? 0) + 1,
-                        [fields[current.entity + ":" + current.field][0] +
-                        "-color"]:
-                            fields[current.entity + ":" + current.field][1],
-                    },
-                }),
-                {} as any
-            )
-        );
-    }, [data, view.fields]);
-
-    console.log(transformedData);
+        const rows: { [key: string]: any } = {};
+        view.fields.forEach((field) => {
+            const series = findSeries(bins, field);
+            if (!series) {
+                return;
+            }
+            series.keys.forEach((key, index) => {
+                rows[key] = rows[key] ?? { key };
+                rows[key][field.name] =
+                    (rows[key][field.name] ?? 0) +
+                    (measure === "durations"
+                        ? series.durations[index] / 3600
+                        : series.counts[index]);
+                rows[key][field.name + "-color"] = field.color;
+            });
+        });
+        return Object.values(rows);
+    }, [bins, view.fields, measure]);
 
     return (
-        <ResponsiveBar
-            data={transformedData ?? []}
-            animate
-            theme={{
-                textColor: mode === "dark" ? "#cccccc" : "#333333",
-                grid: {
-                    line: {
-                        stroke: mode === "dark" ? "#cccccc44" : "#33333344",
+        <>
+            <SegmentedControl
+                size="xs"
+                pos="absolute"
+                top={0}
+                right={0}
+                style={{ zIndex: 1 }}
+                value={measure}
+                onChange={(value) => setMeasure(value as FrequencyMeasure)}
+                data={[
+                    { value: "durations", label: "Time" },
+                    { value: "counts", label: "Samples" },
+                ]}
+            />
+            <ResponsiveBar
+                data={transformedData ?? []}
+                animate
+                theme={{
+                    textColor: mode === "dark" ? "#cccccc" : "#333333",
+                    grid: {
+                        line: {
+                            stroke:
+                                mode === "dark" ? "#cccccc44" : "#33333344",
+                        },
                     },
-                },
-                tooltip: {
-                    container: {
-                        backgroundColor:
-                            mode === "dark"
-                                ? theme.colors.dark[6]
-                                : theme.colors.gray[1],
+                    tooltip: {
+                        container: {
+                            backgroundColor:
+                                mode === "dark"
+                                    ? theme.colors.dark[6]
+                                    : theme.colors.gray[1],
+                        },
                     },
-                },
-            }}
-            keys={view.fields.map((v) => v.name)}
-            indexBy="key"
-            axisBottom={{
-                tickSize: 5,
-                tickPadding: 5,
-                tickRotation: 0,
-                legend: "Value",
-                legendPosition: "middle",
-                legendOffset: 32,
-            }}
-            axisLeft={{
-                tickSize: 5,
-                tickPadding: 5,
-                tickRotation: 0,
-                legend: "Frequency",
-                legendPosition: "middle",
-                legendOffset: -40,
-            }}
-            valueScale={{ type: "linear" }}
-            indexScale={{ type: "band", round: true }}
-            margin={{ top: 8, right: 48, bottom: 64, left: 24 }}
-            colors={view.fields.map((field) => field.color)}
-        />
+                }}
+                keys={view.fields.map((v) => v.name)}
+                indexBy="key"
+                axisBottom={{
+                    tickSize: 5,
+                    tickPadding: 5,
+                    tickRotation: 0,
+                    legend: "Value",
+                    legendPosition: "middle",
+                    legendOffset: 32,
+                }}
+                axisLeft={{
+                    tickSize: 5,
+                    tickPadding: 5,
+                    tickRotation: 0,
+                    legend: measure === "durations" ? "Hours" : "Frequency",
+                    legendPosition: "middle",
+                    legendOffset: -40,
+                }}
+                valueScale={{ type: "linear" }}
+                indexScale={{ type: "band", round: true }}
+                margin={{ top: 8, right: 48, bottom: 64, left: 24 }}
+                valueFormat={(value) =>
+                    measure === "durations"
+                        ? `${value.toFixed(1)}h`
+                        : value.toString()
+                }
+                colors={view.fields.map((field) => field.color)}
+            />
+        </>
     );
 });
 
 export function ViewGraph({ view }: { view: View }) {
-    const data = useData(view);
+    const { ref, width } = useElementSize();
+    const data = useData(view, width);
+    const bins = useBins(view);
 
     return (
-        <Box className="view-graph" h={"100%"}>
+        <Box className="view-graph" h={"100%"} pos="relative" ref={ref}>
             {view.type === "linear" && (
                 <GraphTypeLinear data={data} view={view} />
             )}
             {view.type === "frequency" && (
-                <GraphTypeFrequency data={data} view={view} />
+                <GraphTypeFrequency bins={bins} view={view} />
             )}
         </Box>
     );
@@ -1,5 +1,11 @@
 import { memo } from "react";
-import { ViewType } from "../../types/data";
+import {
+    DataEntry,
+    View,
+    ViewColumns,
+    ViewSeries,
+    ViewType,
+} from "../../types/data";
 import { IconBaseProps } from "react-icons";
 import { MdBarChart, MdLineAxis } from "react-icons/md";
 
@@ -14,6 +20,76 @@ export const ViewIcon = memo(
     }
 );
 
+export function decodeColumns(columns: ViewColumns[]): ViewSeries[] {
+    return columns.map(({ times, ...series }) => {
+        let time = 0;
+        return {
+            ...series,
+            times: times.map((delta) => (time += delta)),
+        };
+    });
+}
+
+export function findSeries<T extends { entity: string; field: string }>(
+    data: T[],
+    field: { entity: string; field: string }
+): T | undefined {
+    return data.find(
+        (series) =>
+            series.entity === field.entity && series.field === field.field
+    );
+}
+
+export function viewWindowStart(view: View): number {
+    return (
+        (view.range.mode === "delta"
+            ? Date.now() / 1000 + view.range.start
+            : view.range.start) * 1000
+    );
+}
+
+export function appendRows(
+    data: ViewSeries[],
+    rows: DataEntry[],
+    windowStart: number
+): ViewSeries[] {
+    const updated = data.map((series) => ({
+        ...series,
+        times: [...series.times],
+        values: [...series.values],
+    }));
+    rows.forEach((row) => {
+        let series = findSeries(updated, row);
+        if (!series) {
+            series = {
+                entity: row.entity,
+                field: row.field,
+                times: [],
+                values: [],
+            };
+            updated.push(series);
+        }
+        const time = row.time * 1000;
+        if (
+            series.times.length > 0 &&
+            time <= series.times[series.times.length - 1]
+        ) {
+            return;
+        }
+        series.times.push(time);
+        series.values.push(row.value);
+    });
+    return updated.map((series) => {
+        const first = series.times.findIndex((time) => time >= windowStart);
+        const cut = first === -1 ? series.times.length : first;
+        return {
+            ...series,
+            times: series.times.slice(cut),
+            values: series.values.slice(cut),
+        };
+    });
+}
+
 export function guessTimeUnit(seconds: number): string {
     if (seconds < 60) return `${2 * Math.ceil(seconds / 60)} seconds`;
     if (seconds < 3600) return `${2 * Math.ceil(seconds / 3600)} minutes`;
@@ -6,6 +6,36 @@ export type DataEntry = {
     time: number;
 };
 
+// Columnar view data; times are integer milliseconds, the first absolute and
+// the rest deltas from the previous point.
+export type ViewColumns = {
+    entity: string;
+    field: string;
+    times: number[];
+    values: any[];
+};
+
+export type ViewSeries = {
+    entity: string;
+    field: string;
+    times: number[];
+    values: any[];
+};
+
+export type ViewBins = {
+    entity: string;
+    field: string;
+    kind: "states" | "histogram";
+    keys: string[];
+    counts: number[];
+    durations: number[];
+};
+
+export type ViewDataEvent = {
+    view: string;
+    rows: DataEntry[];
+};
+
 export type ViewType = "linear" | "frequency";
 
 export type ViewField = {
@@ -39,7 +39,11 @@ export type FieldMetadataTypes =
     | "icon"
     | "attribution";
 
-export type TrackedFieldType = { field: string; logging: boolean } & (
+export type TrackedFieldType = {
+    field: string;
+    logging: boolean;
+    retention?: number | null;
+} & (
     | {
           type: "boolean";
           trueName: string;
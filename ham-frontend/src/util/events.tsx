@@ -5,6 +5,7 @@ import {
     useContext,
     useEffect,
     useMemo,
+    useRef,
     useState,
 } from "react";
 import { fetchEventSource } from "@microsoft/fetch-event-source";
@@ -19,22 +20,26 @@ export interface ServerEvent {
 export type ServerEventHandler = <T>(
     id: string,
     event: string,
-    handler: (event: T) => void
+    handler: (event: T) => void,
+    topic: string
 ) => void;
 
 export type EventContextType = {
     addHandler: ServerEventHandler;
     removeHandler: (id: string) => void;
+    resync: number;
 };
 
 const EventContext = createContext<EventContextType>({
     addHandler: () => {},
     removeHandler: () => {},
+    resync: 0,
 });
 
 type HandlerItem = {
     event: string;
     handler: (event: any) => void;
+    topic: string;
 };
 
 type HandlerMap = { [key: string]: HandlerItem };
@@ -45,26 +50,52 @@ export function EventsProvider({
     children: ReactNode | ReactNode[] | undefined;
 }) {
     const [handlers, setHandlers] = useState<HandlerMap>({});
+    const handlersRef = useRef<HandlerMap>(handlers);
+    handlersRef.current = handlers;
+    const lastEventId = useRef<string | null>(null);
+    const [resync, setResync] = useState(0);
     const { token } = useApi();
 
+    // The server only sends events for these topics, so the stream is only
+    // reopened when the set of topics changes, not on every handler update.
+    const topics = useMemo(
+        () =>
+            Array.from(
+                new Set(Object.values(handlers).map(({ topic }) => topic))
+            )
+                .sort()
+                .join(","),
+        [handlers]
+    );
+
     useEffect(() => {
         const controller = new AbortController();
-        if (!token) {
+        if (!token || topics.length === 0) {
             return;
         }
-        fetchEventSource("/api/events", {
+        fetchEventSource(`/api/events?topics=${encodeURIComponent(topics)}`, {
             method: "GET",
+            // Lets the server replay whatever was missed while disconnected;
+            // fetchEventSource updates the same header when it retries.
             headers: {
                 Authorization: token,
+                ...(lastEventId.current
+                    ? { "last-event-id": lastEventId.current }
+                    : {}),
             },
             signal: controller.signal,
             onmessage(ev) {
+                if (ev.id) {
+                    lastEventId.current = ev.id;
+                }
                 if (ev.data && ev.data.length > 0) {
                     try {
                         const decoded = JSON.parse(ev.data);
-                        if (decoded.EventType) {
+                        if (decoded.EventType === "resync") {
+                            setResync((current) => current + 1);
+                        } else if (decoded.EventType) {
                             const { EventType, ...data } = decoded;
-                            Object.values(handlers).map(
+                            Object.values(handlersRef.current).map(
                                 ({ event, handler }) => {
                                     if (event === EventType) {
                                         handler(data);
@@ -79,15 +110,15 @@ export function EventsProvider({
             },
         });
         return () => controller.abort();
-    }, [token, handlers]);
+    }, [token, topics]);
 
     return (
         <EventContext.Provider
             value={{
-                addHandler: (id, event, handler) =>
+                addHandler: (id, event, handler, topic) =>
                     setHandlers((curHandlers) => ({
                         ...curHandlers,
-                        [id]: { event, handler },
+                        [id]: { event, handler, topic },
                     })),
                 removeHandler: (id) => {
                     const removed = Object.keys(handlers).reduce(
@@ -99,6 +130,7 @@ export function EventsProvider({
                     );
                     setHandlers(removed);
                 },
+                resync,
             }}
         >
             {children}
@@ -109,14 +141,21 @@ export function EventsProvider({
 export function useEvent<T>(
     id: string,
     type: string,
-    handler: (event: T) => void
+    handler: (event: T) => void,
+    topic: string = type
 ) {
     const { addHandler, removeHandler } = useContext(EventContext);
 
     useEffect(() => {
-        addHandler(id, type, handler);
+        addHandler(id, type, handler, topic);
         return () => removeHandler(id);
-    }, [type, handler]);
+    }, [type, handler, topic]);
+}
+
+// Changes when the server could not replay missed events, so anything
+// loaded before then should be fetched again
+export function useResync(): number {
+    return useContext(EventContext).resync;
 }
 
 export type BasicState = {
@@ -125,10 +164,25 @@ export type BasicState = {
     attributes: { [key: string]: any };
 };
 
+// Sent at most once per frame per entity, holding only what changed since
+// the previous frame
+export type StateDiff = {
+    entity_id: string;
+    state?: any;
+    attributes?: { [key: string]: any };
+    unset?: string[];
+    removed?: boolean;
+};
+
+export type StateFrame = {
+    entities: StateDiff[];
+};
+
 export function useEntityState(entityId: string): BasicState | null {
     const [entity, setEntity] = useState<BasicState | null>(null);
     const uuid = useMemo(() => v4(), [entityId]);
     const { get } = useApi();
+    const resync = useResync();
 
     useEffect(() => {
         get<Entity>(`/ha/entities/${entityId}`).then((result) =>
@@ -140,23 +194,39 @@ export function useEntityState(entityId: string): BasicState | null {
                   })
                 : setEntity(null)
         );
-    }, [entityId]);
+    }, [entityId, resync]);
 
     const stateUpdateFunc = useCallback(
-        (event: any) => {
-            if (event?.data?.entity_id === entityId && event?.data?.new_state) {
-                const newState = event.data.new_state;
-                setEntity({
-                    entityId: newState.entity_id,
-                    state: newState.state,
-                    attributes: newState.attributes,
-                });
+        (event: StateFrame) => {
+            const diff = (event?.entities ?? []).find(
+                (item) => item.entity_id === entityId
+            );
+            if (!diff) {
+                return;
             }
+            if (diff.removed) {
+                setEntity(null);
+                return;
+            }
+            setEntity((current) => {
+                const attributes = { ...(current?.attributes ?? {}) };
+                (diff.unset ?? []).forEach((key) => delete attributes[key]);
+                return {
+                    entityId,
+                    state: "state" in diff ? diff.state : current?.state,
+                    attributes: { ...attributes, ...(diff.attributes ?? {}) },
+                };
+            });
         },
         [entityId]
     );
 
-    useEvent<any>(`watch-state-${uuid}-${entityId}`, "states", stateUpdateFunc);
+    useEvent<StateFrame>(
+        `watch-state-${uuid}-${entityId}`,
+        "states",
+        stateUpdateFunc,
+        `states:${entityId}`
+    );
 
     return entity;
 }
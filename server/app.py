@@ -3,35 +3,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 import os
-from util import dep_app_state
-from lowhass import HASS
+from util import dep_app_state, async_storage_client, construct_detail, ConcurrentModificationError, WriteBuffer, AsyncHASS, EntityStateCache, ViewCache, ViewIndex, SessionCache, LoginThrottle, StateFrames
 from litestar import Litestar, MediaType, Request, Response, get
 from litestar.di import Provide
 from litestar.status_codes import *
 from litestar.datastructures import State
-from pymongo.mongo_client import MongoClient
 import time
 import logging
-from models import CoreConfigEntry
+from models import CoreConfigEntry, DataEntry, DataBucket, Session, MODELS
 from litestar.channels import ChannelsPlugin
 from litestar.channels.backends.memory import MemoryChannelsBackend
 
 from controllers import *
 from tasks import *
 
-client = MongoClient(os.getenv("MONGO_ADDR"))
+client = async_storage_client()
 database = client[os.getenv("MONGO_DATABASE", "ham")]
+data_buffer = (
+    WriteBuffer(database[DataBucket.collection_name], prepare=DataBucket.append_ops)
+    if os.getenv("DATA_LAYOUT", "sample") == "bucket"
+    else WriteBuffer(database[DataEntry.collection_name])
+)
+session_buffer = WriteBuffer(database[Session.collection_name], flush_age=Session.FLUSH_AGE, prepare=Session.activity_ops)
 channels = ChannelsPlugin(
-    channels=["events"],
+    arbitrary_channels_allowed=True,
     backend=MemoryChannelsBackend(),
     subscriber_max_backlog=10000,
     subscriber_backlog_strategy="dropleft"
 )
-
-try:
-    config = CoreConfigEntry.load(database)
-except:
-    config = None
+state_frames = StateFrames(channels)
 
 
 @get("/")
@@ -47,22 +47,71 @@ def internal_exc_handler(request: Request, exc: Exception) -> Response:
         status_code=500,
     )
 
+
+def conflict_exc_handler(request: Request, exc: ConcurrentModificationError) -> Response:
+    return Response(
+        content={
+            "status_code": HTTP_409_CONFLICT,
+            "detail": construct_detail("orm.conflict", str(exc), {"model": exc.model, "id": exc.id}),
+        },
+        status_code=HTTP_409_CONFLICT,
+    )
+
+async def ensure_indexes(app: Litestar):
+    for model in MODELS:
+        try:
+            await model.aensure_indexes(database)
+        except:
+            logging.exception(f"Failed to check indexes on {model.collection_name}:\n")
+
+async def load_config(app: Litestar):
+    try:
+        config = await CoreConfigEntry.aload(database)
+    except:
+        config = None
+    app.state.home_assistant = AsyncHASS(config.home_assistant_address, config.home_assistant_token) if config else None
+
 async def start_tasks(app: Litestar):
     loop = asyncio.get_event_loop()
     loop.create_task(task_check_status(app, channels))
     loop.create_task(hass_websocket_manager(app, channels, loop))
+    loop.create_task(state_frames.run())
     loop.create_task(task_collect_data(app, channels))
+    loop.create_task(data_buffer.run())
+    loop.create_task(task_rollup_data(app))
+    loop.create_task(session_buffer.run())
+    loop.create_task(task_sweep_sessions(app))
+
+async def stop_tasks(app: Litestar):
+    await data_buffer.close()
+    await session_buffer.close()
+    state_frames.close()
+    if app.state.home_assistant:
+        await app.state.home_assistant.close()
+    await client.close()
 
 app = Litestar(
-    route_handlers=[root, ConfigController, AuthController, AccountController, EventController, HAController, ViewController],
+    route_handlers=[root, ConfigController, AuthController, AccountController, EventController, HAController, ViewController, DataController],
     dependencies={"app_state": Provide(dep_app_state)},
     state=State(
         {
             "db": client[os.getenv("MONGO_DATABASE", "ham")],
-            "home_assistant": HASS(config.home_assistant_address, config.home_assistant_token) if config else None,
+            "home_assistant": None,
+            "entity_states": EntityStateCache(),
+            "view_cache": ViewCache(),
+            "view_index": ViewIndex(),
+            "session_cache": SessionCache(),
+            "session_buffer": session_buffer,
+            "login_throttle": LoginThrottle(),
+            "data_logger": DataLogger(database, data_buffer),
+            "state_frames": state_frames,
         }
     ),
-    exception_handlers={HTTP_500_INTERNAL_SERVER_ERROR: internal_exc_handler},
+    exception_handlers={
+        HTTP_500_INTERNAL_SERVER_ERROR: internal_exc_handler,
+        ConcurrentModificationError: conflict_exc_handler,
+    },
     plugins=[channels],
-    on_startup=[start_tasks]
+    on_startup=[ensure_indexes, load_config, start_tasks],
+    on_shutdown=[stop_tasks]
 )
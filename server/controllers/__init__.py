@@ -3,4 +3,5 @@ from .auth import AuthController
 from .accounts import AccountController
 from .events import EventController
 from .ha import HAController
-from .views import ViewController
\ No newline at end of file
+from .views import ViewController
+from .data import DataController
\ No newline at end of file
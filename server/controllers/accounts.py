@@ -1,4 +1,4 @@
-from litestar import Controller, get, post
+from litestar import Controller, Request, get, post
 from litestar.di import Provide
 from litestar.exceptions import *
 from util import (
@@ -7,7 +7,8 @@ from util import (
     depends_session,
     depends_user,
     AppState,
-    construct_detail
+    construct_detail,
+    login_throttled,
 )
 from models import UserConfigEntry, UserModel, PERMISSION_TYPES, PERMISSION_SCOPES
 from pydantic import BaseModel
@@ -30,19 +31,25 @@ class AccountController(Controller):
     
     @post("/me/settings")
     async def post_user_settings(self, app_state: AppState, user: UserConfigEntry, data: AccountSettingsModel) -> UserModel:
-        existence_check = UserConfigEntry.load_username(app_state.db, data.username)
+        existence_check = await UserConfigEntry.aload_username(app_state.db, data.username)
         if existence_check and existence_check.id != user.id:
             raise MethodNotAllowedException(construct_detail("account.exists", f"Another account with name {data.username} already exists."))
         user.username = data.username
-        user.save()
+        await user.asave()
+        app_state.session_cache.invalidate_user(user.id)
         return UserModel.from_entry(user)
     
     @post("/me/settings/password")
-    async def post_update_password(self, user: UserConfigEntry, data: AccountPasswordModel) -> UserModel:
-        if not user.verify(data.current):
+    async def post_update_password(self, request: Request, app_state: AppState, user: UserConfigEntry, data: AccountPasswordModel) -> UserModel:
+        wait = app_state.login_throttle.attempt(user.username, request.client.host if request.client else None)
+        if wait > 0:
+            raise login_throttled(wait)
+        if not await user.averify(data.current):
             raise PermissionDeniedException(construct_detail("auth.login.password", message="Incorrect password entered"))
-        user.update_password(data.new)
-        user.save()
+        app_state.login_throttle.succeeded(user.username)
+        await user.aupdate_password(data.new)
+        await user.asave()
+        app_state.session_cache.invalidate_user(user.id)
         return UserModel.from_entry(user)
     
     @get("/me/permissions/{permission:str}")
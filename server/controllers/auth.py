@@ -1,14 +1,15 @@
 from models import Session, UserModel
-from litestar import Controller, get, post
+from litestar import Controller, Request, get, post
 from litestar.exceptions import *
-from litestar.datastructures import Headers
 from litestar.di import Provide
 from util import (
     AppState,
     guard_hasSession,
     depends_session,
+    connection_session,
     guard_loggedIn,
     construct_detail,
+    login_throttled,
 )
 from pydantic import BaseModel
 from typing import Union
@@ -28,13 +29,13 @@ class AuthController(Controller):
     path = "/auth"
 
     @get("/token")
-    async def get_token(self, app_state: AppState, headers: Headers) -> TokenResponse:
-        session: Session = None
-        if "Authorization" in headers.keys() and headers["Authorization"] != "null":
-            session = Session.load_id(app_state.db, headers["Authorization"])
+    async def get_token(self, request: Request, app_state: AppState) -> TokenResponse:
+        session: Session = await connection_session(request)
         if not session:
             session = Session(app_state.db)
-        session.update()
+            await session.aupdate()
+        elif session.touch():
+            await app_state.session_buffer.put(session)
         return TokenResponse(token=session.id, uid=session.uid)
 
     @post(
@@ -42,14 +43,18 @@ class AuthController(Controller):
         guards=[guard_hasSession],
         dependencies={"session": Provide(depends_session)},
     )
-    async def login(self, session: Session, data: LoginModel) -> UserModel:
-        result = session.login(data.username, data.password)
+    async def login(self, request: Request, app_state: AppState, session: Session, data: LoginModel) -> UserModel:
+        wait = app_state.login_throttle.attempt(data.username, request.client.host if request.client else None)
+        if wait > 0:
+            raise login_throttled(wait)
+        result = await session.alogin(data.username, data.password)
         if not result:
             raise NotFoundException(
                 construct_detail(
                     "auth.login.invalid", "Username or password is incorrect."
                 )
             )
+        app_state.login_throttle.succeeded(data.username)
         return UserModel.from_entry(result)
 
     @post(
@@ -57,6 +62,7 @@ class AuthController(Controller):
         guards=[guard_hasSession, guard_loggedIn],
         dependencies={"session": Provide(depends_session)},
     )
-    async def logout(self, session: Session) -> None:
-        session.logout()
+    async def logout(self, app_state: AppState, session: Session) -> None:
+        await session.alogout()
+        app_state.session_cache.invalidate_session(session.id)
         return None
@@ -3,8 +3,8 @@ from litestar import Controller, get, post
 from litestar.datastructures import State
 from litestar.di import Provide
 from litestar.exceptions import *
-from util import AppState, guard_hasSession, depends_session, construct_detail, guard_has_permission
-from lowhass import HASS
+from util import AppState, guard_hasSession, depends_session, construct_detail, guard_has_permission, replace_hass
+from util.hashing import password_hasher
 from typing import *
 from pydantic import BaseModel
 import time
@@ -48,39 +48,43 @@ class ConfigController(Controller):
     @get("/")
     async def get_core_config(self, app_state: AppState) -> ConfigModel:
         try:
-            return ConfigModel.from_entry(CoreConfigEntry.load(app_state.db))
+            return ConfigModel.from_entry(await CoreConfigEntry.aload(app_state.db))
         except:
             return ConfigModel(initialized=False, homeassistant_address=None, location_name=None)
     
     @post("/setup")
     async def setup_configuration(self, state: State, app_state: AppState, data: SetupModel, session: Session) -> ConfigModel:
         try:
-            currentConfig = CoreConfigEntry.load(app_state.db)
+            currentConfig = await CoreConfigEntry.aload(app_state.db)
         except IndexError:
             currentConfig = ConfigModel(initialized=False, homeassistant_address=None, location_name=None)
         if currentConfig.initialized:
             raise MethodNotAllowedException(construct_detail("config.setup.done", message="Configuration is already initialized."))
         new_core = CoreConfigEntry(app_state.db, time.time(), True, data.ha_address, data.ha_token, data.location_name)
-        new_user = UserConfigEntry.create(app_state.db, data.username, data.password)
+        new_user = await UserConfigEntry.acreate(app_state.db, data.username, data.password)
         new_user.permissions = {p: "edit" for p in PERMISSION_SCOPES_ARRAY}
-        new_core.save()
-        new_user.save()
+        await new_core.asave()
+        await new_user.asave()
         session.uid = new_user.id
-        session.update()
-        state.home_assistant = HASS(data.ha_address, data.ha_token)
+        await session.aupdate()
+        state.home_assistant = await replace_hass(state.home_assistant, data.ha_address, data.ha_token)
         return ConfigModel.from_entry(new_core)
     
     @get("/full", guards=[guard_has_permission], opt={"scope": "settings", "allowed": ["view", "edit"]})
     async def get_full_config(self, app_state: AppState) -> FullConfigModel:
-        cfg = CoreConfigEntry.load(app_state.db)
+        cfg = await CoreConfigEntry.aload(app_state.db)
         return FullConfigModel.from_entry(cfg)
     
     @post("/full", guards=[guard_has_permission], opt={"scope": "settings", "allowed": ["edit"]})
     async def update_config(self, app_state: AppState, data: UpdateConfigModel, state: State) -> FullConfigModel:
-        cfg = CoreConfigEntry.load(app_state.db)
+        cfg = await CoreConfigEntry.aload(app_state.db)
         cfg.location_name = data.location_name
         cfg.home_assistant_address = data.homeassistant_address
         cfg.home_assistant_token = data.homeassistant_token
-        state.home_assistant = HASS(data.homeassistant_address, data.homeassistant_token)
-        cfg.save()
-        return FullConfigModel.from_entry(cfg)
\ No newline at end of file
+        state.home_assistant = await replace_hass(state.home_assistant, data.homeassistant_address, data.homeassistant_token)
+        await cfg.asave()
+        return FullConfigModel.from_entry(cfg)
+
+    @get("/metrics", guards=[guard_has_permission], opt={"scope": "settings", "allowed": ["view", "edit"]})
+    async def get_metrics(self) -> dict[str, dict[str, float]]:
+        return {"password_hashing": password_hasher.metrics()}
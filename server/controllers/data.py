@@ -0,0 +1,36 @@
+from litestar import Controller, get
+from litestar.response import Stream
+from util import guard_has_permission, guard_loggedIn, AppState
+from util.export import DataExporter, EXPORT_FORMAT, EXPORT_MEDIA_TYPES, abatched
+from models import DataEntry
+from typing import AsyncIterator, Optional
+
+
+class DataController(Controller):
+    path = "/data"
+    opt = {"scope": "data", "allowed": ["view", "edit"]}
+    guards = [guard_loggedIn, guard_has_permission]
+
+    @get("/export")
+    async def export_data(
+        self,
+        app_state: AppState,
+        format: EXPORT_FORMAT = "csv",
+        entity: Optional[list[str]] = None,
+        field: Optional[list[str]] = None,
+        start: float = -1,
+        end: float = -1,
+    ) -> Stream:
+        query = DataEntry.export_query(entity, field, start, end)
+
+        async def chunks() -> AsyncIterator[bytes]:
+            exporter = DataExporter(format)
+            async for batch in abatched(DataEntry.aexport(app_state.db, query)):
+                yield exporter.write(batch)
+            yield exporter.close()
+
+        return Stream(
+            chunks(),
+            media_type=EXPORT_MEDIA_TYPES[format],
+            headers={"Content-Disposition": f'attachment; filename="ham-data.{format}"'},
+        )
@@ -1,5 +1,11 @@
 from litestar import Controller, get, Request
-from util import guard_hasSession, depends_session, ASGISourceResponse, EventSourceResponse, Session
+from litestar.exceptions import ValidationException
+from litestar.params import Parameter
+from litestar.serialization import encode_json
+from util import guard_hasSession, depends_session, construct_detail, ASGISourceResponse, EventSourceResponse, Session
+from util.topics import EVENT_TOPICS, subscription_channels, topic_index
+from util.event_log import decode_message, event_log
+from typing import Optional
 import asyncio
 import time
 from litestar.channels import ChannelsPlugin
@@ -9,13 +15,40 @@ class EventController(Controller):
     path = "/events"
 
     @get("/", guards=[guard_hasSession], dependencies={"session": Provide(depends_session)})
-    async def test_events(self, request: Request, channels: ChannelsPlugin, session: Session) -> EventSourceResponse:
+    async def test_events(
+        self,
+        request: Request,
+        channels: ChannelsPlugin,
+        session: Session,
+        topics: Optional[str] = None,
+        last_event_id: Optional[str] = Parameter(header="Last-Event-ID", default=None),
+    ) -> EventSourceResponse:
+        try:
+            subscribed = subscription_channels(topics.split(",") if topics else EVENT_TOPICS)
+        except ValueError as exc:
+            raise ValidationException(construct_detail("events.topic.invalid", message=str(exc)))
+
         async def sub_events():
-            subscriber = await channels.subscribe(["events"])
+            topic_index.add(subscribed)
+            subscriber = await channels.subscribe(subscribed)
             try:
+                # Events up to here are replayed from the log, so skip them if
+                # they also reach the subscriber
+                replayed_to = 0
+                if last_event_id:
+                    replayed_to = event_log.last_id
+                    replayed = event_log.replay(subscribed, int(last_event_id)) if last_event_id.isdigit() else None
+                    if replayed == None:
+                        yield {"id": str(replayed_to), "data": encode_json({"EventType": "resync"}).decode()}
+                    else:
+                        for event_id, payload in replayed:
+                            yield {"id": str(event_id), "data": encode_json(payload).decode()}
                 async for message in subscriber.iter_events():
-                    yield message.decode()
+                    event_id, data = decode_message(message)
+                    if event_id > replayed_to:
+                        yield {"id": str(event_id), "data": data}
             finally:
                 await channels.unsubscribe(subscriber)
+                topic_index.remove(subscribed)
         
         return ASGISourceResponse(sub_events(), request)
\ No newline at end of file
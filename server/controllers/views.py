@@ -1,10 +1,17 @@
-from litestar import Controller, get, post
+from litestar import Controller, MediaType, Request, Response, get, post
+from litestar.response import Stream
 from litestar.exceptions import *
 from util import guard_has_permission, guard_loggedIn, AppState, event, construct_detail
 from models import View, ViewField, ViewRange, DataEntry
 from pydantic import BaseModel
 from litestar.channels import ChannelsPlugin
-from typing import Any
+from typing import Any, AsyncIterator, Literal, Optional, Union
+import json
+import msgspec
+from util.downsample import REDUCE_MODE
+
+
+MSGPACK_TYPE = "application/msgpack"
 
 
 class CreateViewModel(BaseModel):
@@ -65,7 +72,8 @@ class ViewController(Controller):
             fields=data.fields,
             range=data.range,
         )
-        created.save()
+        await created.asave()
+        app_state.view_index.add(created)
         event(channels, "views", {"id": created.id})
         return ViewModel.from_view(created)
 
@@ -73,12 +81,45 @@ class ViewController(Controller):
     async def list_views(self, app_state: AppState) -> list[ViewModel]:
         return [
             ViewModel.from_view(View.from_dict(app_state.db, v))
-            for v in app_state.db[View.collection_name].find()
+            async for v in app_state.db[View.collection_name].find()
         ]
     
     @get("/{view:str}/data")
-    async def get_view_data(self, app_state: AppState, view: str) -> list[DataEntryModel]:
-        loaded_view: View = View.load_id(app_state.db, view)
+    async def get_view_data(
+        self,
+        app_state: AppState,
+        request: Request,
+        view: str,
+        points: Optional[int] = None,
+        reduce: REDUCE_MODE = "lttb",
+        format: Literal["rows", "columns", "bins"] = "rows",
+    ) -> Union[list[DataEntryModel], Response]:
+        loaded_view: View = await View.aload_id(app_state.db, view)
         if not loaded_view:
             raise NotFoundException(construct_detail("view.not_found", message="View not found"))
-        return [DataEntryModel.from_entry(d) for d in loaded_view.get_view_data()]
+        if points != None and points < 3:
+            raise ValidationException(construct_detail("view.points", message="At least 3 points are required"))
+        if format == "bins":
+            if loaded_view.type != "frequency":
+                raise ValidationException(construct_detail("view.bins", message="Bins are only available for frequency views"))
+            return Response(await loaded_view.aget_view_bins())
+        if request.accept.best_match([MediaType.JSON, MSGPACK_TYPE]) == MSGPACK_TYPE:
+            columns = View.view_columns(await loaded_view.aget_view_rows(points, reduce, app_state.view_cache))
+            return Response(msgspec.msgpack.encode(columns), media_type=MSGPACK_TYPE)
+        if format == "columns":
+            return Response(View.view_columns(await loaded_view.aget_view_rows(points, reduce, app_state.view_cache)))
+        return [DataEntryModel.from_entry(d) for d in await loaded_view.aget_view_data(points, reduce, app_state.view_cache)]
+
+    @get("/{view:str}/data/stream")
+    async def stream_view_data(self, app_state: AppState, view: str, points: Optional[int] = None, reduce: REDUCE_MODE = "lttb") -> Stream:
+        loaded_view: View = await View.aload_id(app_state.db, view)
+        if not loaded_view:
+            raise NotFoundException(construct_detail("view.not_found", message="View not found"))
+        if points != None and points < 3:
+            raise ValidationException(construct_detail("view.points", message="At least 3 points are required"))
+
+        async def rows() -> AsyncIterator[str]:
+            async for row in loaded_view.astream_view_data(points, reduce):
+                yield json.dumps(row, default=str) + "\n"
+
+        return Stream(rows(), media_type="application/x-ndjson")
@@ -0,0 +1,155 @@
+from dotenv import load_dotenv
+
+load_dotenv()
+import argparse
+import os
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError
+from typing import Any, Iterable
+from uuid import NAMESPACE_URL, uuid4, uuid5
+import util  # util must be initialized before models, which import from it
+from util.storage import storage_client
+from util.export import DataExporter, batched
+from util.recorder import csv_states, history_states
+from models import DataEntry, DataBucket, MODELS
+from models.data import BUCKET_SIZE
+from tasks.data_collection import get_field_value
+
+
+def migrate_batch(db: Database, batch: list[dict[str, Any]], bucket_size: float):
+    try:
+        db[DataBucket.collection_name].bulk_write(DataBucket.append_ops(batch, bucket_size), ordered=False)
+    except BulkWriteError as exc:
+        # Duplicate keys are appends an interrupted run already made
+        if any(error["code"] != 11000 for error in exc.details["writeErrors"]):
+            raise
+    db[DataEntry.collection_name].delete_many({"id": {"$in": [sample["id"] for sample in batch]}})
+
+
+def migrate_buckets(db: Database, batch_size: int, bucket_size: float):
+    # Samples are marked with their batch before being appended, so a rerun
+    # after an interruption repeats exactly the same appends, which the bucket
+    # tokens then skip.
+    source = db[DataEntry.collection_name]
+    target = db[DataBucket.collection_name]
+    DataBucket.ensure_indexes(db)
+    migrated = 0
+    interrupted: dict[str, list[dict[str, Any]]] = {}
+    for sample in source.find({"migration": {"$exists": True}}, {"_id": 0}):
+        interrupted.setdefault(sample.pop("migration"), []).append(sample)
+    for batch in interrupted.values():
+        migrate_batch(db, batch, bucket_size)
+        migrated += len(batch)
+        print(f"Resumed {migrated} samples")
+    while True:
+        batch = list(source.find({}, {"_id": 0}).limit(batch_size))
+        if len(batch) == 0:
+            break
+        source.update_many({"id": {"$in": [sample["id"] for sample in batch]}}, {"$set": {"migration": uuid4().hex}})
+        migrate_batch(db, batch, bucket_size)
+        migrated += len(batch)
+        print(f"Migrated {migrated} samples")
+    print(f"Done, {target.count_documents({})} buckets in {target.name}")
+
+
+def ensure_indexes(db: Database):
+    for model in MODELS:
+        created, conflicts = model.ensure_indexes(db)
+        for index in created:
+            print(f"Created {model.collection_name}.{index.document['name']}")
+        for conflict in conflicts:
+            print(f"Conflict: {conflict}")
+
+
+def export_data(db: Database, format: str, output: str, entities: list[str], fields: list[str], start: float, end: float):
+    exporter = DataExporter(format)
+    exported = 0
+    with open(output, "wb") as file:
+        for batch in batched(DataEntry.export(db, DataEntry.export_query(entities, fields, start, end))):
+            file.write(exporter.write(batch))
+            exported += len(batch)
+            print(f"Exported {exported} samples")
+        file.write(exporter.close())
+    print(f"Done, wrote {output}")
+
+
+def recorder_samples(states: Iterable[dict[str, Any]], fields: list[str]) -> Iterable[dict[str, Any]]:
+    for state in states:
+        for field in fields:
+            value = get_field_value(state, field)
+            if value == None:
+                continue
+            # Stable ids make re-running an import skip samples it already wrote
+            key = f"{state['entity_id']}|{field}|{state['time']}"
+            yield {
+                "id": uuid5(NAMESPACE_URL, key).hex,
+                "entity": state["entity_id"],
+                "field": field,
+                "time": state["time"],
+                "value": value,
+            }
+
+
+def import_recorder(db: Database, path: str, fields: list[str], batch_size: int):
+    collection = db[DataEntry.collection_name]
+    reader = csv_states if path.endswith(".csv") else history_states
+    imported = 0
+    skipped = 0
+    with open(path, newline="") as file:
+        for batch in batched(recorder_samples(reader(file), fields), batch_size):
+            try:
+                imported += len(collection.insert_many(batch, ordered=False).inserted_ids)
+            except BulkWriteError as exc:
+                imported += exc.details["nInserted"]
+                skipped += len(batch) - exc.details["nInserted"]
+            print(f"Imported {imported} samples, skipped {skipped} already present")
+    print(f"Done, {imported} samples imported into {collection.name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HA-Manager maintenance commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    migrate = commands.add_parser(
+        "migrate-buckets",
+        help="Move per-sample data documents into time-bucketed documents",
+    )
+    migrate.add_argument("--batch-size", type=int, default=10000)
+    migrate.add_argument("--bucket-size", type=float, default=BUCKET_SIZE)
+
+    commands.add_parser(
+        "ensure-indexes",
+        help="Create missing indexes and report conflicting ones",
+    )
+
+    export = commands.add_parser(
+        "export",
+        help="Write logged data to a CSV, Arrow IPC or Parquet file",
+    )
+    export.add_argument("output")
+    export.add_argument("--format", choices=["csv", "arrow", "parquet"], default="csv")
+    export.add_argument("--entity", action="append")
+    export.add_argument("--field", action="append")
+    export.add_argument("--start", type=float, default=-1)
+    export.add_argument("--end", type=float, default=-1)
+
+    recorder = commands.add_parser(
+        "import-recorder",
+        help="Import a Home Assistant history export (JSON from the history API, or the history panel CSV); run migrate-buckets afterwards when using the bucket layout",
+    )
+    recorder.add_argument("path")
+    recorder.add_argument("--field", action="append")
+    recorder.add_argument("--batch-size", type=int, default=10000)
+
+    args = parser.parse_args()
+    client = storage_client()
+    database = client[os.getenv("MONGO_DATABASE", "ham")]
+
+    if args.command == "migrate-buckets":
+        migrate_buckets(database, args.batch_size, args.bucket_size)
+    elif args.command == "ensure-indexes":
+        ensure_indexes(database)
+    elif args.command == "export":
+        export_data(database, args.format, args.output, args.entity, args.field, args.start, args.end)
+    elif args.command == "import-recorder":
+        import_recorder(database, args.path, args.field or ["state"], args.batch_size)
@@ -1,3 +1,5 @@
 from .config import ConfigEntry, CoreConfigEntry, UserConfigEntry, PERMISSION_SCOPES_ARRAY, PERMISSION_SCOPES, PERMISSION_TYPES, USER_PERMISSIONS, UserModel, EntityConfigEntry
 from .session import Session
-from .data import DataEntry, View, ViewField, ViewRange
\ No newline at end of file
+from .data import DataEntry, DataBucket, DataRollup, RollupState, View, ViewField, ViewRange
+
+MODELS = [ConfigEntry, Session, DataEntry, DataBucket, DataRollup, RollupState, View]
\ No newline at end of file
@@ -1,14 +1,16 @@
 import os
 from pydantic import BaseModel
+from pymongo import IndexModel, ASCENDING
 from pymongo.database import Database
+from pymongo.asynchronous.database import AsyncDatabase
 from util import ORM
+from util.hashing import hash_password, password_hasher
 from typing import *
 import time
 import datetime
-import hashlib
+import hmac
 
 CONFIG_GROUP = Literal["core", "user", "entity"]
-HASH_ITERS = 500000
 
 PERMISSION_TYPES = Literal["disabled", "view", "edit"]
 PERMISSION_SCOPES_ARRAY = ["data", "settings", "accounts", "areas", "rules"]
@@ -17,7 +19,13 @@ USER_PERMISSIONS = dict[PERMISSION_SCOPES, PERMISSION_TYPES]
 
 
 class ConfigEntry(ORM):
+    __slots__ = ("group", "last_update")
     collection_name = "config"
+    version_field = "last_update"
+    indexes = ORM.indexes + [
+        IndexModel([("group", ASCENDING), ("haid", ASCENDING)]),
+        IndexModel([("group", ASCENDING), ("username", ASCENDING)]),
+    ]
 
     def __init__(
         self,
@@ -39,8 +47,14 @@ class ConfigEntry(ORM):
         self.last_update = time.time()
         return super().save()
 
+    async def asave(self):
+        self.last_update = time.time()
+        return await super().asave()
+
 
 class CoreConfigEntry(ConfigEntry):
+    __slots__ = ("initialized", "home_assistant_address", "home_assistant_token", "location_name")
+
     def __init__(
         self,
         db: Database,
@@ -61,8 +75,14 @@ class CoreConfigEntry(ConfigEntry):
     def load(cls, db: Database) -> "CoreConfigEntry":
         return super().load(db, {"id": "core"})[0]
 
+    @classmethod
+    async def aload(cls, db: AsyncDatabase) -> "CoreConfigEntry":
+        return (await super().aload(db, {"id": "core"}))[0]
+
 
 class UserConfigEntry(ConfigEntry):
+    __slots__ = ("username", "password_hash", "password_salt", "permissions")
+
     def __init__(
         self,
         db: Database,
@@ -81,11 +101,7 @@ class UserConfigEntry(ConfigEntry):
         self.permissions = permissions
 
     @classmethod
-    def create(cls, db: Database, username: str, password: str) -> "UserConfigEntry":
-        salt = os.urandom(32)
-        hashed_password = hashlib.pbkdf2_hmac(
-            "sha256", password.encode("utf-8"), salt, HASH_ITERS
-        ).hex()
+    def from_hash(cls, db: Union[Database, AsyncDatabase], username: str, salt: bytes, hashed_password: str) -> "UserConfigEntry":
         return UserConfigEntry(
             db,
             last_update=time.time(),
@@ -95,23 +111,41 @@ class UserConfigEntry(ConfigEntry):
             permissions={"data": "view"},
         )
 
+    @classmethod
+    def create(cls, db: Database, username: str, password: str) -> "UserConfigEntry":
+        salt = os.urandom(32)
+        return cls.from_hash(db, username, salt, hash_password(password, salt))
+
+    @classmethod
+    async def acreate(cls, db: AsyncDatabase, username: str, password: str) -> "UserConfigEntry":
+        salt = os.urandom(32)
+        return cls.from_hash(db, username, salt, await password_hasher.hash(password, salt))
+
     @classmethod
     def load_username(
         cls, db: Database, username: str
     ) -> Union["UserConfigEntry", None]:
-        result = cls.load(db, {"username": username})
+        result = cls.load(db, {"group": "user", "username": username})
+        if len(result) == 0:
+            return None
+        return result[0]
+
+    @classmethod
+    async def aload_username(
+        cls, db: AsyncDatabase, username: str
+    ) -> Union["UserConfigEntry", None]:
+        result = await cls.aload(db, {"group": "user", "username": username})
         if len(result) == 0:
             return None
         return result[0]
 
     def verify(self, password: str) -> bool:
-        hashed_password = hashlib.pbkdf2_hmac(
-            "sha256",
-            password.encode("utf-8"),
-            bytes.fromhex(self.password_salt),
-            HASH_ITERS,
-        ).hex()
-        return hashed_password == self.password_hash
+        hashed_password = hash_password(password, bytes.fromhex(self.password_salt))
+        return hmac.compare_digest(hashed_password, self.password_hash)
+
+    async def averify(self, password: str) -> bool:
+        hashed_password = await password_hasher.hash(password, bytes.fromhex(self.password_salt))
+        return hmac.compare_digest(hashed_password, self.password_hash)
 
     @property
     def absolute_permissions(self) -> USER_PERMISSIONS:
@@ -125,9 +159,12 @@ class UserConfigEntry(ConfigEntry):
 
     def update_password(self, new_password: str):
         salt = os.urandom(32)
-        self.password_hash = hashlib.pbkdf2_hmac(
-            "sha256", new_password.encode("utf-8"), salt, HASH_ITERS
-        ).hex()
+        self.password_hash = hash_password(new_password, salt)
+        self.password_salt = salt.hex()
+
+    async def aupdate_password(self, new_password: str):
+        salt = os.urandom(32)
+        self.password_hash = await password_hasher.hash(new_password, salt)
         self.password_salt = salt.hex()
 
 
@@ -144,6 +181,8 @@ class UserModel(BaseModel):
 
 
 class EntityConfigEntry(ConfigEntry):
+    __slots__ = ("haid", "name", "type", "tracked_values")
+
     def __init__(
         self,
         db: Database,
@@ -161,6 +200,20 @@ class EntityConfigEntry(ConfigEntry):
         self.type = type
         self.tracked_values = tracked_values
 
+    def tracked_index(self, field: str) -> Union[int, None]:
+        for index, value in enumerate(self.tracked_values):
+            if value["field"] == field:
+                return index
+        return None
+
+    def update_tracked(self, field: str, **values) -> bool:
+        # Replaces the element in place so saving only touches tracked_values.<index>
+        index = self.tracked_index(field)
+        if index == None:
+            return False
+        self.tracked_values[index] = {**self.tracked_values[index], **values}
+        return True
+
     @classmethod
     def all(cls, db: Database) -> list["EntityConfigEntry"]:
         return [EntityConfigEntry.from_dict(db, e) for e in db[cls.collection_name].find({"group": "entity"})]
@@ -169,3 +222,12 @@ class EntityConfigEntry(ConfigEntry):
     def load_haid(cls, db: Database, entity_id: str) -> Union["EntityConfigEntry", None]:
         result = db[cls.collection_name].find_one({"group": "entity", "haid": entity_id})
         return EntityConfigEntry.from_dict(db, result) if result else None
+
+    @classmethod
+    async def aall(cls, db: AsyncDatabase) -> list["EntityConfigEntry"]:
+        return [EntityConfigEntry.from_dict(db, e) async for e in db[cls.collection_name].find({"group": "entity"})]
+
+    @classmethod
+    async def aload_haid(cls, db: AsyncDatabase, entity_id: str) -> Union["EntityConfigEntry", None]:
+        result = await db[cls.collection_name].find_one({"group": "entity", "haid": entity_id})
+        return EntityConfigEntry.from_dict(db, result) if result else None
@@ -1,15 +1,36 @@
+from pymongo import UpdateOne, IndexModel, ASCENDING, DESCENDING
 from pymongo.database import Database
+from pymongo.asynchronous.database import AsyncDatabase
 from util.model import ORM
-from typing import Any, Literal, TypedDict
+from util.downsample import REDUCE_MODE, reduce_series
+from util.view_cache import CachedRows, ViewCache
+from typing import Any, AsyncIterator, Iterable, Literal, TypedDict, Union
+import itertools
+from uuid import uuid4
+import math
+import numpy as np
 import time
 
+BUCKET_SIZE = 3600  # Seconds of samples held by each DataBucket document
+BUCKET_BATCHES = 16  # Recent append tokens kept per bucket to skip retried appends
+ROLLUP_TIERS = {"minute": 60, "hour": 3600, "day": 86400}
+ROLLUP_RETENTION = {"minute": 30 * 86400, "hour": 730 * 86400, "day": None}
+ROLLUP_DELAY = 60  # Leave recent windows open for buffered writes
+ROLLUP_CHUNK = 1440  # Windows computed per query
+VIEW_CACHE_OVERLAP = 60  # Re-read recent samples that buffered writes may still be adding
+HISTOGRAM_BINS = 20
+
 
 class DataEntry(ORM):
+    __slots__ = ("entity", "field", "time", "value")
     collection_name = "data"
+    indexes = ORM.indexes + [
+        IndexModel([("entity", ASCENDING), ("field", ASCENDING), ("time", ASCENDING)])
+    ]
 
     def __init__(
         self,
-        db: Database,
+        db: Union[Database, AsyncDatabase],
         id: str = None,
         entity: str = None,
         field: str = None,
@@ -23,18 +44,101 @@ class DataEntry(ORM):
         self.time = time
         self.value = value
 
+    @staticmethod
+    def data_query(
+        entity: str,
+        field: str = None,
+        start: float = -1,
+        end: float = -1,
+    ) -> dict:
+        query = {"entity": entity}
+        if field:
+            query["field"] = field
+        if start > -1 or end > -1:
+            query["time"] = {}
+
+            if start > -1:
+                query["time"]["$gte"] = start
+            if end > -1:
+                query["time"]["$lte"] = end
+        return query
+
     @classmethod
     def load_data(
+        cls,
+        db: Union[Database, AsyncDatabase],
+        entity: str,
+        field: str = None,
+        start: float = -1,
+        end: float = -1,
+    ) -> list["DataEntry"]:
+        return cls.find(db, cls.data_query(entity, field, start, end))
+
+    @classmethod
+    def load_data_rows(
         cls,
         db: Database,
         entity: str,
         field: str = None,
         start: float = -1,
         end: float = -1,
+    ) -> list[dict[str, Any]]:
+        return cls.find_rows(db, cls.data_query(entity, field, start, end))
+
+    @classmethod
+    async def aload_data(
+        cls,
+        db: AsyncDatabase,
+        entity: str,
+        field: str = None,
+        start: float = -1,
+        end: float = -1,
     ) -> list["DataEntry"]:
-        query = {"entity": entity}
-        if field:
-            query["field"] = field
+        return await cls.afind(db, cls.data_query(entity, field, start, end))
+
+    @classmethod
+    async def aload_data_rows(
+        cls,
+        db: AsyncDatabase,
+        entity: str,
+        field: str = None,
+        start: float = -1,
+        end: float = -1,
+    ) -> list[dict[str, Any]]:
+        return await cls.afind_rows(db, cls.data_query(entity, field, start, end))
+
+    @classmethod
+    def find_rows(cls, db: Database, query: dict) -> list[dict[str, Any]]:
+        samples = cls.load_rows(db, query)
+        buckets = DataBucket.load_rows(db, DataBucket.bucket_query(query), DataBucket.EXPAND_PROJECTION)
+        return samples + DataBucket.expand_rows(buckets, query.get("time", {}))
+
+    @classmethod
+    async def afind_rows(cls, db: AsyncDatabase, query: dict) -> list[dict[str, Any]]:
+        samples = await cls.aload_rows(db, query)
+        buckets = await DataBucket.aload_rows(db, DataBucket.bucket_query(query), DataBucket.EXPAND_PROJECTION)
+        return samples + DataBucket.expand_rows(buckets, query.get("time", {}))
+
+    @classmethod
+    def find(cls, db: Database, query: dict) -> list["DataEntry"]:
+        return [cls.from_dict(db, row) for row in cls.find_rows(db, query)]
+
+    @classmethod
+    async def afind(cls, db: AsyncDatabase, query: dict) -> list["DataEntry"]:
+        return [cls.from_dict(db, row) for row in await cls.afind_rows(db, query)]
+
+    @staticmethod
+    def export_query(
+        entities: list[str] = None,
+        fields: list[str] = None,
+        start: float = -1,
+        end: float = -1,
+    ) -> dict:
+        query = {}
+        if entities:
+            query["entity"] = {"$in": entities}
+        if fields:
+            query["field"] = {"$in": fields}
         if start > -1 or end > -1:
             query["time"] = {}
 
@@ -42,8 +146,43 @@ class DataEntry(ORM):
                 query["time"]["$gte"] = start
             if end > -1:
                 query["time"]["$lte"] = end
+        return query
+
+    @classmethod
+    def export_pipeline(cls, query: dict) -> list[dict]:
+        return [
+            {"$match": query},
+            {"$project": {"_id": 0, "id": 1, "entity": 1, "field": 1, "time": 1, "value": 1}},
+            {"$unionWith": {"coll": DataBucket.collection_name, "pipeline": DataBucket.expand_pipeline([query])}},
+        ]
+
+    @classmethod
+    def export(cls, db: Database, query: dict) -> Iterable[dict[str, Any]]:
+        return db[cls.collection_name].aggregate(cls.export_pipeline(query), allowDiskUse=True, batchSize=1000)
 
-        return [DataEntry.from_dict(db, i) for i in db[cls.collection_name].find(query)]
+    @classmethod
+    async def aexport(cls, db: AsyncDatabase, query: dict) -> AsyncIterator[dict[str, Any]]:
+        cursor = await db[cls.collection_name].aggregate(cls.export_pipeline(query), allowDiskUse=True, batchSize=1000)
+        async for row in cursor:
+            yield row
+
+    @staticmethod
+    def latest_row(samples: list[dict[str, Any]], buckets: list[dict[str, Any]], before: float) -> Union[dict[str, Any], None]:
+        rows = [sample for sample in samples if sample] + DataBucket.expand_rows(buckets, {"$lt": before})
+        return max(rows, key=lambda row: row["time"]) if len(rows) > 0 else None
+
+    @classmethod
+    def last_before(cls, db: Database, entity: str, field: str, before: float) -> Union[dict[str, Any], None]:
+        # The newest bucket starting before the time may only hold later samples, so two are read
+        sample = db[cls.collection_name].find_one({"entity": entity, "field": field, "time": {"$lt": before}}, {"_id": 0}, sort=[("time", DESCENDING)])
+        buckets = db[DataBucket.collection_name].find({"entity": entity, "field": field, "start": {"$lt": before}}, DataBucket.EXPAND_PROJECTION).sort("start", DESCENDING).limit(2)
+        return cls.latest_row([sample], list(buckets), before)
+
+    @classmethod
+    async def alast_before(cls, db: AsyncDatabase, entity: str, field: str, before: float) -> Union[dict[str, Any], None]:
+        sample = await db[cls.collection_name].find_one({"entity": entity, "field": field, "time": {"$lt": before}}, {"_id": 0}, sort=[("time", DESCENDING)])
+        buckets = db[DataBucket.collection_name].find({"entity": entity, "field": field, "start": {"$lt": before}}, DataBucket.EXPAND_PROJECTION).sort("start", DESCENDING).limit(2)
+        return cls.latest_row([sample], await buckets.to_list(None), before)
 
     @classmethod
     def create(cls, db: Database, entity: str, field: str, value: Any) -> "DataEntry":
@@ -51,6 +190,351 @@ class DataEntry(ORM):
         entry.save()
         return entry
 
+    @classmethod
+    async def acreate(cls, db: AsyncDatabase, entity: str, field: str, value: Any) -> "DataEntry":
+        entry = DataEntry(db, entity=entity, field=field, time=time.time(), value=value)
+        await entry.asave()
+        return entry
+
+
+def in_range(value: float, condition: dict[str, float]) -> bool:
+    return (
+        value >= condition.get("$gte", value)
+        and value <= condition.get("$lte", value)
+        and ("$gt" not in condition or value > condition["$gt"])
+        and ("$lt" not in condition or value < condition["$lt"])
+    )
+
+
+class DataBucket(ORM):
+    __slots__ = ("entity", "field", "start", "end", "count", "times", "values", "batches")
+    collection_name = "data_buckets"
+    EXPAND_PROJECTION = {"id": 1, "entity": 1, "field": 1, "times": 1, "values": 1}
+    indexes = ORM.indexes + [
+        IndexModel([("entity", ASCENDING), ("field", ASCENDING), ("start", ASCENDING)], unique=True)
+    ]
+
+    def __init__(
+        self,
+        db: Union[Database, AsyncDatabase],
+        id: str = None,
+        entity: str = None,
+        field: str = None,
+        start: float = 0,
+        end: float = 0,
+        count: int = 0,
+        times: list[float] = [],
+        values: list[Any] = [],
+        batches: list[str] = [],
+        **kwargs
+    ):
+        super().__init__(db, id, **kwargs)
+        self.entity = entity
+        self.field = field
+        self.start = start
+        self.end = end
+        self.count = count
+        self.times = times
+        self.values = values
+        self.batches = batches
+
+    @staticmethod
+    def bucket_start(timestamp: float, size: float = BUCKET_SIZE) -> float:
+        return timestamp - timestamp % size
+
+    @staticmethod
+    def bucket_query(query: dict) -> dict:
+        bucket_query = {k: v for k, v in query.items() if k != "time"}
+        if "time" in query:
+            condition = query["time"]
+            if "$gte" in condition or "$gt" in condition:
+                bucket_query["end"] = {"$gt": condition.get("$gte", condition.get("$gt"))}
+            if "$lte" in condition or "$lt" in condition:
+                bucket_query["start"] = {"$lte": condition.get("$lte", condition.get("$lt"))}
+        return bucket_query
+
+    @staticmethod
+    def expand_rows(buckets: list[dict[str, Any]], condition: dict[str, float] = {}) -> list[dict[str, Any]]:
+        return [
+            {"id": f"{bucket['id']}.{index}", "entity": bucket["entity"], "field": bucket["field"], "time": t, "value": v}
+            for bucket in buckets
+            for index, (t, v) in enumerate(zip(bucket["times"], bucket["values"]))
+            if in_range(t, condition)
+        ]
+
+    @staticmethod
+    def append_token(samples: list[dict[str, Any]]) -> str:
+        return min(sample["id"] for sample in samples)
+
+    @classmethod
+    def expand_pipeline(cls, queries: list[dict]) -> list[dict]:
+        return [
+            {"$match": {"$or": [cls.bucket_query(q) for q in queries]}},
+            {"$unwind": {"path": "$times", "includeArrayIndex": "index"}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "id": {"$concat": ["$id", ".", {"$toString": "$index"}]},
+                    "entity": 1,
+                    "field": 1,
+                    "time": "$times",
+                    "value": {"$arrayElemAt": ["$values", "$index"]},
+                }
+            },
+            {"$match": {"$or": queries}},
+        ]
+
+    @classmethod
+    def append_ops(cls, samples: list[dict[str, Any]], size: float = BUCKET_SIZE) -> list[UpdateOne]:
+        # Each append carries a token derived from its samples. A retried append
+        # finds the token already in the bucket, so its filter misses and the
+        # upsert fails with a duplicate key instead of pushing the samples twice.
+        grouped: dict[tuple[str, str, float], list[dict[str, Any]]] = {}
+        for sample in samples:
+            key = (sample["entity"], sample["field"], cls.bucket_start(sample["time"], size))
+            grouped.setdefault(key, []).append(sample)
+        return [
+            UpdateOne(
+                {"entity": entity, "field": field, "start": start, "batches": {"$ne": cls.append_token(group)}},
+                {
+                    "$push": {
+                        "times": {"$each": [s["time"] for s in group]},
+                        "values": {"$each": [s["value"] for s in group]},
+                        "batches": {"$each": [cls.append_token(group)], "$slice": -BUCKET_BATCHES},
+                    },
+                    "$inc": {"count": len(group)},
+                    "$setOnInsert": {"id": uuid4().hex, "end": start + size},
+                },
+                upsert=True,
+            )
+            for (entity, field, start), group in grouped.items()
+        ]
+
+
+def to_number(value: Any) -> Union[float, None]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+class DataRollup(ORM):
+    __slots__ = ("entity", "field", "tier", "time", "min", "max", "avg", "sum", "count")
+    collection_name = "data_rollups"
+    indexes = ORM.indexes + [
+        IndexModel([("entity", ASCENDING), ("field", ASCENDING), ("tier", ASCENDING), ("time", ASCENDING)], unique=True),
+        IndexModel([("tier", ASCENDING), ("time", ASCENDING)]),
+    ]
+
+    def __init__(
+        self,
+        db: Union[Database, AsyncDatabase],
+        id: str = None,
+        entity: str = None,
+        field: str = None,
+        tier: str = "minute",
+        time: float = 0,
+        min: float = 0,
+        max: float = 0,
+        avg: float = 0,
+        sum: float = 0,
+        count: int = 0,
+        **kwargs
+    ):
+        super().__init__(db, id, **kwargs)
+        self.entity = entity
+        self.field = field
+        self.tier = tier
+        self.time = time
+        self.min = min
+        self.max = max
+        self.avg = avg
+        self.sum = sum
+        self.count = count
+
+    def to_entry(self) -> DataEntry:
+        return DataEntry(self.db, id=self.id, entity=self.entity, field=self.field, time=self.time, value=self.avg)
+
+    @classmethod
+    def entry_pipeline(cls, queries: list[dict], extremes: bool = False) -> list[dict]:
+        if not extremes:
+            return [
+                {"$match": {"$or": queries}},
+                {"$project": {"_id": 0, "id": 1, "entity": 1, "field": 1, "time": 1, "value": "$avg"}},
+            ]
+        # Reduced views need the window's peaks rather than its average
+        return [
+            {"$match": {"$or": queries}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "rows": [
+                        {"id": "$id", "entity": "$entity", "field": "$field", "time": "$time", "value": "$min"},
+                        {"id": "$id", "entity": "$entity", "field": "$field", "time": "$time", "value": "$max"},
+                    ],
+                }
+            },
+            {"$unwind": "$rows"},
+            {"$replaceRoot": {"newRoot": "$rows"}},
+        ]
+
+    @staticmethod
+    def tier_for(resolution: float) -> Union[str, None]:
+        tiers = [tier for tier, size in ROLLUP_TIERS.items() if size <= resolution]
+        return tiers[-1] if len(tiers) > 0 else None
+
+    @classmethod
+    def combine(cls, rows: list[tuple[float, float, float, float, int]], size: float) -> dict[float, tuple[float, float, float, int]]:
+        windows: dict[float, tuple[float, float, float, int]] = {}
+        for timestamp, low, high, total, count in rows:
+            window = DataBucket.bucket_start(timestamp, size)
+            if window in windows:
+                w_low, w_high, w_total, w_count = windows[window]
+                windows[window] = (min(w_low, low), max(w_high, high), w_total + total, w_count + count)
+            else:
+                windows[window] = (low, high, total, count)
+        return windows
+
+    @classmethod
+    def rollup_ops(cls, entity: str, field: str, tier: str, windows: dict[float, tuple[float, float, float, int]]) -> list[UpdateOne]:
+        return [
+            UpdateOne(
+                {"entity": entity, "field": field, "tier": tier, "time": window},
+                {
+                    "$set": {"min": low, "max": high, "sum": total, "count": count, "avg": total / count},
+                    "$setOnInsert": {"id": uuid4().hex},
+                },
+                upsert=True,
+            )
+            for window, (low, high, total, count) in windows.items()
+        ]
+
+    @classmethod
+    async def asource_rows(cls, db: AsyncDatabase, entity: str, field: str, tier: Union[str, None], start: float, end: float) -> list[tuple[float, float, float, float, int]]:
+        if tier == None:
+            rows = []
+            for entry in await DataEntry.afind_rows(db, {"entity": entity, "field": field, "time": {"$gte": start, "$lt": end}}):
+                value = to_number(entry["value"])
+                if value != None:
+                    rows.append((entry["time"], value, value, value, 1))
+            return rows
+        return [
+            (r["time"], r["min"], r["max"], r["sum"], r["count"])
+            async for r in db[cls.collection_name].find({"entity": entity, "field": field, "tier": tier, "time": {"$gte": start, "$lt": end}})
+        ]
+
+    @staticmethod
+    def history_query(entity: str, field: str, start: float, end: float, now: float) -> Union[dict, None]:
+        # Each stretch of the range is read from the finest tier still retained there
+        ranges = []
+        for tier, retention in ROLLUP_RETENTION.items():
+            low = max(start, now - retention) if retention else start
+            if low < end:
+                ranges.append({"entity": entity, "field": field, "tier": tier, "time": {"$gte": low, "$lt": end}})
+                end = low
+        return {"$or": ranges} if len(ranges) > 0 else None
+
+    @staticmethod
+    def history_row(rollup: dict[str, Any]) -> dict[str, Any]:
+        return {"id": rollup["id"], "entity": rollup["entity"], "field": rollup["field"], "time": rollup["time"], "value": rollup["avg"], "count": rollup["count"]}
+
+    @classmethod
+    def history_rows(cls, db: Database, entity: str, field: str, start: float, end: float, now: float) -> list[dict[str, Any]]:
+        query = cls.history_query(entity, field, start, end, now)
+        if query == None:
+            return []
+        return [cls.history_row(rollup) for rollup in db[cls.collection_name].find(query, {"_id": 0}).sort("time", ASCENDING)]
+
+    @classmethod
+    async def ahistory_rows(cls, db: AsyncDatabase, entity: str, field: str, start: float, end: float, now: float) -> list[dict[str, Any]]:
+        query = cls.history_query(entity, field, start, end, now)
+        if query == None:
+            return []
+        return [cls.history_row(rollup) for rollup in await db[cls.collection_name].find(query, {"_id": 0}).sort("time", ASCENDING).to_list(None)]
+
+    @classmethod
+    async def afirst_time(cls, db: AsyncDatabase, entity: str, field: str, tier: Union[str, None]) -> Union[float, None]:
+        if tier == None:
+            sample = await db[DataEntry.collection_name].find_one({"entity": entity, "field": field}, sort=[("time", ASCENDING)])
+            bucket = await db[DataBucket.collection_name].find_one({"entity": entity, "field": field}, sort=[("start", ASCENDING)])
+            candidates = ([sample["time"]] if sample else []) + ([bucket["start"]] if bucket else [])
+        else:
+            rollup = await db[cls.collection_name].find_one({"entity": entity, "field": field, "tier": tier}, sort=[("time", ASCENDING)])
+            candidates = [rollup["time"]] if rollup else []
+        return min(candidates) if len(candidates) > 0 else None
+
+    @classmethod
+    async def aupdate_series(cls, db: AsyncDatabase, entity: str, field: str, now: float = None):
+        now = now if now else time.time()
+        state = await RollupState.aload_series(db, entity, field)
+        source: Union[str, None] = None
+        for tier, size in ROLLUP_TIERS.items():
+            cutoff = DataBucket.bucket_start(now - ROLLUP_DELAY, size)
+            start = state.watermarks.get(tier, None)
+            if start == None:
+                start = await cls.afirst_time(db, entity, field, source)
+            if start != None:
+                start = DataBucket.bucket_start(start, size)
+                while start < cutoff:
+                    end = min(cutoff, start + size * ROLLUP_CHUNK)
+                    windows = cls.combine(await cls.asource_rows(db, entity, field, source, start, end), size)
+                    if len(windows) > 0:
+                        await db[cls.collection_name].bulk_write(cls.rollup_ops(entity, field, tier, windows), ordered=False)
+                    start = end
+                state.watermarks[tier] = start
+                if not tier in state.rolled and await db[cls.collection_name].find_one({"entity": entity, "field": field, "tier": tier}, {"_id": 1}):
+                    state.rolled.append(tier)
+            source = tier
+        await state.asave()
+
+    @classmethod
+    async def aexpire_series(cls, db: AsyncDatabase, entity: str, field: str, retention: float, now: float = None):
+        cutoff = (now if now else time.time()) - retention
+        await db[DataEntry.collection_name].delete_many({"entity": entity, "field": field, "time": {"$lt": cutoff}})
+        await db[DataBucket.collection_name].delete_many({"entity": entity, "field": field, "end": {"$lte": cutoff}})
+
+    @classmethod
+    async def aexpire_tiers(cls, db: AsyncDatabase, now: float = None):
+        now = now if now else time.time()
+        for tier, retention in ROLLUP_RETENTION.items():
+            if retention:
+                await db[cls.collection_name].delete_many({"tier": tier, "time": {"$lt": now - retention}})
+
+
+class RollupState(ORM):
+    __slots__ = ("entity", "field", "watermarks", "rolled")
+    collection_name = "data_rollup_state"
+    indexes = ORM.indexes + [
+        IndexModel([("entity", ASCENDING), ("field", ASCENDING)], unique=True)
+    ]
+
+    def __init__(
+        self,
+        db: Union[Database, AsyncDatabase],
+        id: str = None,
+        entity: str = None,
+        field: str = None,
+        watermarks: dict[str, float] = {},
+        rolled: list[str] = [],
+        **kwargs
+    ):
+        super().__init__(db, id, **kwargs)
+        self.entity = entity
+        self.field = field
+        self.watermarks = watermarks if watermarks else {}
+        self.rolled = rolled if rolled else []  # Tiers holding rollup rows; non-numeric series never get any
+
+    @classmethod
+    def load_series(cls, db: Database, entity: str, field: str) -> "RollupState":
+        result = db[cls.collection_name].find_one({"entity": entity, "field": field})
+        return cls.from_dict(db, result) if result else RollupState(db, entity=entity, field=field)
+
+    @classmethod
+    async def aload_series(cls, db: AsyncDatabase, entity: str, field: str) -> "RollupState":
+        result = await db[cls.collection_name].find_one({"entity": entity, "field": field})
+        return cls.from_dict(db, result) if result else RollupState(db, entity=entity, field=field)
+
 
 VIEW_DATA_TYPE = Literal["linear", "frequency"]
 
@@ -69,17 +553,52 @@ class ViewRange(TypedDict):
     resolution: float
 
 
+class ViewColumns(TypedDict):
+    entity: str
+    field: str
+    times: list[int]
+    values: list[Any]
+
+
+class ViewBins(TypedDict):
+    entity: str
+    field: str
+    kind: Literal["states", "histogram"]
+    keys: list[str]
+    counts: list[int]
+    durations: list[float]
+
+
+async def aseries_groups(rows: AsyncIterator[dict[str, Any]]) -> AsyncIterator[list[dict[str, Any]]]:
+    items: list[dict[str, Any]] = []
+    async for row in rows:
+        if len(items) > 0 and (row["entity"], row["field"]) != (items[0]["entity"], items[0]["field"]):
+            yield items
+            items = []
+        items.append(row)
+    if len(items) > 0:
+        yield items
+
+
+def series_groups(rows: Iterable[dict[str, Any]]) -> Iterable[list[dict[str, Any]]]:
+    for _, items in itertools.groupby(rows, key=lambda row: (row["entity"], row["field"])):
+        yield list(items)
+
+
 class View(ORM):
+    __slots__ = ("name", "type", "fields", "range", "last_update")
     collection_name = "views"
+    version_field = "last_update"
 
     def __init__(
         self,
-        db: Database,
+        db: Union[Database, AsyncDatabase],
         id: str = None,
         name: str = None,
         type: VIEW_DATA_TYPE = "frequency",
         fields: list[ViewField] = [],
         range: ViewRange = None,
+        last_update: float = 0,
         **kwargs
     ):
         super().__init__(db, id, **kwargs)
@@ -87,10 +606,17 @@ class View(ORM):
         self.type = type
         self.fields = fields
         self.range = range
+        self.last_update = last_update
+
+    def save(self):
+        self.last_update = time.time()
+        return super().save()
 
-    def get_view_data(self) -> list[DataEntry]:
-        entities = [f["entity"] for f in self.fields]
-        fields = [f["field"] for f in self.fields]
+    async def asave(self):
+        self.last_update = time.time()
+        return await super().asave()
+
+    def time_range(self) -> tuple[float, float]:
         start = (
             self.range["start"]
             if self.range["mode"] == "absolute"
@@ -101,24 +627,316 @@ class View(ORM):
             if self.range["mode"] == "absolute"
             else time.time() + self.range["end"]
         )
-        full_results: list[DataEntry] = sorted(
-            DataEntry.load(
-                self.db,
-                {
-                    "entity": {"$in": entities},
-                    "field": {"$in": fields},
-                    "time": {"$lte": end, "$gte": start},
-                },
-            ),
-            key=lambda e: e.time,
+        return start, end
+
+    def series(self) -> list[tuple[str, str]]:
+        return list(dict.fromkeys((f["entity"], f["field"]) for f in self.fields))
+
+    def rollup_tier(self, resolution: float = None) -> Union[str, None]:
+        if self.type != "linear":
+            return None
+        return DataRollup.tier_for(resolution if resolution != None else self.range["resolution"])
+
+    def source_queries(self, start: float, end: float, tier: Union[str, None], watermarks: dict[tuple[str, str], float] = {}) -> tuple[list[dict], list[dict]]:
+        raw_queries: list[dict] = []
+        rollup_queries: list[dict] = []
+        for entity, field in self.series():
+            covered = start
+            if tier and (entity, field) in watermarks:
+                covered = min(max(watermarks.get((entity, field), start), start), end)
+                rollup_queries.append({"entity": entity, "field": field, "tier": tier, "time": {"$gte": start, "$lt": covered}})
+            raw_queries.append({"entity": entity, "field": field, "time": {"$gte": covered, "$lte": end}})
+        return raw_queries, rollup_queries
+
+    def resolution_stages(self, resolution: float, by_series: bool = False, extremes: bool = False) -> list[dict]:
+        order = {"entity": 1, "field": 1, "time": 1} if by_series else {"time": 1}
+        if resolution <= 0:
+            return [{"$sort": order}]
+        bucket = {
+            "entity": "$entity",
+            "field": "$field",
+            "bucket": {"$floor": {"$divide": ["$time", resolution]}},
+        }
+        if extremes:
+            # Keeps the lowest and highest sample of each bucket, so peaks
+            # survive until the reduction picks points.
+            return [
+                {"$sort": {"value": 1, "time": 1}},
+                {"$group": {"_id": bucket, "low": {"$first": "$$ROOT"}, "high": {"$last": "$$ROOT"}}},
+                {"$project": {"_id": 0, "rows": {"$setUnion": [["$low"], ["$high"]]}}},
+                {"$unwind": "$rows"},
+                {"$replaceRoot": {"newRoot": "$rows"}},
+                {"$sort": order},
+            ]
+        return [
+            {"$sort": {"time": 1}},
+            {
+                "$group": {
+                    "_id": bucket,
+                    "id": {"$first": "$id"},
+                    "entity": {"$first": "$entity"},
+                    "field": {"$first": "$field"},
+                    "time": {"$first": "$time"},
+                    "value": {"$first": "$value"},
+                }
+            },
+            {"$project": {"_id": 0}},
+            {"$sort": order},
+        ]
+
+    def view_pipeline(
+        self,
+        start: float,
+        end: float,
+        resolution: float,
+        watermarks: dict[tuple[str, str], float] = {},
+        by_series: bool = False,
+        extremes: bool = False,
+    ) -> list[dict]:
+        raw_queries, rollup_queries = self.source_queries(start, end, self.rollup_tier(resolution), watermarks)
+        pipeline = [
+            {"$match": {"$or": raw_queries}},
+            {"$project": {"_id": 0, "id": 1, "entity": 1, "field": 1, "time": 1, "value": 1}},
+            {"$unionWith": {"coll": DataBucket.collection_name, "pipeline": DataBucket.expand_pipeline(raw_queries)}},
+        ]
+        if len(rollup_queries) > 0:
+            pipeline.append({"$unionWith": {"coll": DataRollup.collection_name, "pipeline": DataRollup.entry_pipeline(rollup_queries, extremes)}})
+        return pipeline + self.resolution_stages(resolution, by_series, extremes)
+
+    def watermark_query(self) -> dict:
+        return {"entity": {"$in": [entity for entity, _ in self.series()]}}
+
+    def watermarks(self, states: list["RollupState"], tier: str) -> dict[tuple[str, str], float]:
+        return {
+            (state.entity, state.field): state.watermarks[tier]
+            for state in states
+            if tier in state.watermarks and tier in state.rolled
+        }
+
+    def reduce_series_rows(self, items: list[dict[str, Any]], points: int, mode: REDUCE_MODE) -> list[dict[str, Any]]:
+        values = np.array([to_number(i["value"]) for i in items], dtype=float)
+        if np.isnan(values).any():
+            return items
+        times = np.array([i["time"] for i in items], dtype=float)
+        return [items[index] for index in reduce_series(times, values, points, mode)]
+
+    def reduce_view_data(self, rows: list[dict[str, Any]], points: int, mode: REDUCE_MODE) -> list[dict[str, Any]]:
+        series: dict[tuple[str, str], list[dict[str, Any]]] = {}
+        for row in rows:
+            series.setdefault((row["entity"], row["field"]), []).append(row)
+        reduced: list[dict[str, Any]] = []
+        for items in series.values():
+            reduced.extend(self.reduce_series_rows(items, points, mode))
+        return sorted(reduced, key=lambda r: r["time"])
+
+    def reduced_resolution(self, start: float, end: float, points: int, mode: REDUCE_MODE) -> float:
+        # The pipeline hands the reduction each bucket's lowest and highest
+        # sample; non-numeric series can't be reduced, so this also caps them
+        # at a few samples per target point.
+        return max(end - start, 0) / (points * (1 if mode == "minmax" else 4))
+
+    def data_plan(self, points: int = None, mode: REDUCE_MODE = "lttb") -> tuple[float, float, float, Union[str, None]]:
+        start, end = self.time_range()
+        resolution = self.reduced_resolution(start, end, points, mode) if points else self.range["resolution"]
+        if resolution > 0:
+            # Snapping to the bucket grid keeps the first bucket whole, so cached
+            # windows trimmed at the head match a fresh query.
+            start = math.floor(start / resolution) * resolution
+        return start, end, resolution, self.rollup_tier(resolution)
+
+    def cache_key(self, points: Union[int, None], mode: REDUCE_MODE) -> tuple:
+        return (self.id, self.last_update, points, mode if points else None)
+
+    def refresh_start(self, cached: Union[CachedRows, None], start: float, resolution: float) -> float:
+        if cached is None:
+            return start
+        boundary = cached.end - VIEW_CACHE_OVERLAP
+        if resolution > 0:
+            boundary = math.floor(boundary / resolution) * resolution
+        return max(start, boundary)
+
+    def cached_rows(
+        self,
+        cache: Union[ViewCache, None],
+        cached: Union[CachedRows, None],
+        key: tuple,
+        query_start: float,
+        rows: list[dict[str, Any]],
+        start: float,
+        end: float,
+    ) -> list[dict[str, Any]]:
+        if cache is None:
+            return rows
+        if cached is None:
+            cached = CachedRows(rows, end)
+        elif query_start <= end:
+            cached.replace_tail(query_start, rows, end)
+        cached.trim_head(start)
+        cache.put(key, cached)
+        return list(cached.rows)
+
+    def get_view_rows(self, points: int = None, mode: REDUCE_MODE = "lttb", cache: ViewCache = None) -> list[dict[str, Any]]:
+        if len(self.fields) == 0:
+            return []
+        start, end, resolution, tier = self.data_plan(points, mode)
+        key = self.cache_key(points, mode)
+        cached = cache.get(key) if cache is not None else None
+        query_start = self.refresh_start(cached, start, resolution)
+        rows = []
+        if query_start <= end:
+            watermarks = self.watermarks(RollupState.load(self.db, self.watermark_query()), tier) if tier else {}
+            rows = list(self.db[DataEntry.collection_name].aggregate(self.view_pipeline(query_start, end, resolution, watermarks, extremes=points != None), allowDiskUse=True))
+        rows = self.cached_rows(cache, cached, key, query_start, rows, start, end)
+        return self.reduce_view_data(rows, points, mode) if points else rows
+
+    async def aget_view_rows(self, points: int = None, mode: REDUCE_MODE = "lttb", cache: ViewCache = None) -> list[dict[str, Any]]:
+        if len(self.fields) == 0:
+            return []
+        start, end, resolution, tier = self.data_plan(points, mode)
+        key = self.cache_key(points, mode)
+        cached = cache.get(key) if cache is not None else None
+        query_start = self.refresh_start(cached, start, resolution)
+        rows = []
+        if query_start <= end:
+            watermarks = self.watermarks(await RollupState.aload(self.db, self.watermark_query()), tier) if tier else {}
+            cursor = await self.db[DataEntry.collection_name].aggregate(self.view_pipeline(query_start, end, resolution, watermarks, extremes=points != None), allowDiskUse=True)
+            rows = await cursor.to_list(None)
+        rows = self.cached_rows(cache, cached, key, query_start, rows, start, end)
+        return self.reduce_view_data(rows, points, mode) if points else rows
+
+    def get_view_data(self, points: int = None, mode: REDUCE_MODE = "lttb", cache: ViewCache = None) -> list[DataEntry]:
+        return [DataEntry.from_dict(self.db, d) for d in self.get_view_rows(points, mode, cache)]
+
+    async def aget_view_data(self, points: int = None, mode: REDUCE_MODE = "lttb", cache: ViewCache = None) -> list[DataEntry]:
+        return [DataEntry.from_dict(self.db, d) for d in await self.aget_view_rows(points, mode, cache)]
+
+    @staticmethod
+    def view_columns(rows: list[dict[str, Any]]) -> list[ViewColumns]:
+        series: dict[tuple[str, str], list[dict[str, Any]]] = {}
+        for row in rows:
+            series.setdefault((row["entity"], row["field"]), []).append(row)
+        columns: list[ViewColumns] = []
+        for (entity, field), items in series.items():
+            # Times are sent as integer milliseconds, the first absolute and the
+            # rest as deltas, so a running sum restores them exactly.
+            times = np.round(np.array([i["time"] for i in items], dtype=float) * 1000).astype(np.int64)
+            numbers = [to_number(i["value"]) for i in items]
+            columns.append({
+                "entity": entity,
+                "field": field,
+                "times": np.diff(times, prepend=0).tolist(),
+                "values": numbers if None not in numbers else [i["value"] for i in items],
+            })
+        return columns
+
+    async def astream_view_data(self, points: int = None, mode: REDUCE_MODE = "lttb") -> AsyncIterator[dict[str, Any]]:
+        # Yields raw rows straight from the cursor. Reduced output is ordered by
+        # series rather than time, so only one series is held in memory at once.
+        if len(self.fields) == 0:
+            return
+        start, end, resolution, tier = self.data_plan(points, mode)
+        watermarks = self.watermarks(await RollupState.aload(self.db, self.watermark_query()), tier) if tier else {}
+        cursor = await self.db[DataEntry.collection_name].aggregate(
+            self.view_pipeline(start, end, resolution, watermarks, by_series=points != None, extremes=points != None),
+            allowDiskUse=True,
+            batchSize=1000,
+        )
+        if not points:
+            async for row in cursor:
+                yield row
+            return
+        async for items in aseries_groups(cursor):
+            for reduced in self.reduce_series_rows(items, points, mode):
+                yield reduced
+
+    @staticmethod
+    def series_bins(items: list[dict[str, Any]], until: float) -> ViewBins:
+        # Each sample holds its value until the next one, and the last one holds
+        # until the end of the window. Rollup rows count as their sample count.
+        times = np.array([i["time"] for i in items], dtype=float)
+        durations = np.diff(times, append=max(until, times[-1]))
+        counts = np.array([i.get("count", 1) for i in items], dtype=float)
+        numbers = np.array([to_number(i["value"]) for i in items], dtype=float)
+        if not np.isnan(numbers).any():
+            edges = np.histogram_bin_edges(numbers, bins=HISTOGRAM_BINS)
+            indices = np.clip(np.searchsorted(edges, numbers, side="right") - 1, 0, HISTOGRAM_BINS - 1)
+            keys = [f"{low:g}-{high:g}" for low, high in zip(edges[:-1], edges[1:])]
+            kind = "histogram"
+        else:
+            states, indices = np.unique(np.array([str(i["value"]).lower() for i in items]), return_inverse=True)
+            keys = states.tolist()
+            kind = "states"
+        return {
+            "entity": items[0]["entity"],
+            "field": items[0]["field"],
+            "kind": kind,
+            "keys": keys,
+            "counts": np.rint(np.bincount(indices, weights=counts, minlength=len(keys))).astype(int).tolist(),
+            "durations": np.bincount(indices, weights=durations, minlength=len(keys)).tolist(),
+        }
+
+    @staticmethod
+    def needs_previous(rows: list[dict[str, Any]], start: float) -> bool:
+        return len(rows) == 0 or rows[0]["time"] > start
+
+    @staticmethod
+    def carry_previous(rows: list[dict[str, Any]], previous: Union[dict[str, Any], None], start: float) -> list[dict[str, Any]]:
+        # The last value before the window holds until its first row
+        return [{**previous, "time": start, "count": 0}] + rows if previous else rows
+
+    def series_bin_rows(self, entity: str, field: str, items: list[dict[str, Any]], start: float, end: float, now: float) -> list[dict[str, Any]]:
+        # Rollup rows fill in where retention removed the raw samples
+        first = items[0]["time"] if len(items) > 0 else end
+        rows = (DataRollup.history_rows(self.db, entity, field, start, first, now) if first > start else []) + items
+        previous = DataEntry.last_before(self.db, entity, field, start) if self.needs_previous(rows, start) else None
+        return self.carry_previous(rows, previous, start)
+
+    async def aseries_bin_rows(self, entity: str, field: str, items: list[dict[str, Any]], start: float, end: float, now: float) -> list[dict[str, Any]]:
+        first = items[0]["time"] if len(items) > 0 else end
+        rows = (await DataRollup.ahistory_rows(self.db, entity, field, start, first, now) if first > start else []) + items
+        previous = await DataEntry.alast_before(self.db, entity, field, start) if self.needs_previous(rows, start) else None
+        return self.carry_previous(rows, previous, start)
+
+    def get_view_bins(self) -> list[ViewBins]:
+        # Bins weigh every change by how long it held, so they are built from
+        # unpruned samples rather than the view's resolution.
+        if len(self.fields) == 0:
+            return []
+        start, end = self.time_range()
+        now = time.time()
+        cursor = self.db[DataEntry.collection_name].aggregate(
+            self.view_pipeline(start, end, 0, by_series=True),
+            allowDiskUse=True,
+            batchSize=1000,
+        )
+        groups = {key: [] for key in self.series()}
+        bins: list[ViewBins] = []
+        for items in series_groups(cursor):
+            groups.pop((items[0]["entity"], items[0]["field"]), None)
+            bins.append(self.series_bins(self.series_bin_rows(items[0]["entity"], items[0]["field"], items, start, end, now), min(end, now)))
+        for (entity, field), items in groups.items():
+            rows = self.series_bin_rows(entity, field, items, start, end, now)
+            if len(rows) > 0:
+                bins.append(self.series_bins(rows, min(end, now)))
+        return bins
+
+    async def aget_view_bins(self) -> list[ViewBins]:
+        if len(self.fields) == 0:
+            return []
+        start, end = self.time_range()
+        now = time.time()
+        cursor = await self.db[DataEntry.collection_name].aggregate(
+            self.view_pipeline(start, end, 0, by_series=True),
+            allowDiskUse=True,
+            batchSize=1000,
         )
-        resolution_pointers = {f["entity"] + ":" + f["field"]: 0 for f in self.fields}
-        pruned_results: list[DataEntry] = []
-        for r in full_results:
-            if (
-                resolution_pointers[r.entity + ":" + r.field] + self.range["resolution"]
-                < r.time
-            ):
-                resolution_pointers[r.entity + ":" + r.field] = r.time
-                pruned_results.append(r)
-        return sorted(pruned_results, key=lambda e: e.time)
+        groups = {key: [] for key in self.series()}
+        bins: list[ViewBins] = []
+        async for items in aseries_groups(cursor):
+            groups.pop((items[0]["entity"], items[0]["field"]), None)
+            bins.append(self.series_bins(await self.aseries_bin_rows(items[0]["entity"], items[0]["field"], items, start, end, now), min(end, now)))
+        for (entity, field), items in groups.items():
+            rows = await self.aseries_bin_rows(entity, field, items, start, end, now)
+            if len(rows) > 0:
+                bins.append(self.series_bins(rows, min(end, now)))
+        return bins
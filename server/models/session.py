@@ -1,35 +1,96 @@
-from typing import Union
+from typing import Any, Union
+from pymongo import UpdateOne, IndexModel, ASCENDING
 from pymongo.database import Database
+from pymongo.asynchronous.database import AsyncDatabase
 from util.model import ORM
 from .config import UserConfigEntry
+import datetime
 import time
 
 
 class Session(ORM):
+    __slots__ = ("uid", "last_seen", "expires_at")
     collection_name = "sessions"
+    indexes = ORM.indexes + [
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        IndexModel([("uid", ASCENDING), ("last_seen", ASCENDING)]),
+    ]
     EXPIRE_TIME = 7 * 24 * 3600 # Time to expire token w/o activity
+    ANONYMOUS_EXPIRE_TIME = 24 * 3600 # Time to expire never-logged-in tokens w/o activity
+    TOUCH_INTERVAL = 300 # Minimum change in last_seen worth writing
+    FLUSH_AGE = 30 # Seconds activity writes are batched for
 
     def __init__(
         self, 
-        db: Database, 
+        db: Union[Database, AsyncDatabase], 
         id: str = None, 
         uid: Union[str, None] = None,
         last_seen: float = 0,
+        expires_at: Union[datetime.datetime, None] = None,
         **kwargs
     ):
         super().__init__(db, id=id)
         self.uid = uid
         self.last_seen = last_seen
+        self.expires_at = expires_at
     
     @property
     def user(self) -> Union[UserConfigEntry, None]:
         if self.uid:
             return UserConfigEntry.load_id(self.db, self.uid)
         return None
+
+    async def auser(self) -> Union[UserConfigEntry, None]:
+        if self.uid:
+            return await UserConfigEntry.aload_id(self.db, self.uid)
+        return None
     
+    def seen(self, now: float):
+        self.last_seen = now
+        # The TTL index removes the document once this passes
+        self.expires_at = datetime.datetime.fromtimestamp(now + self.EXPIRE_TIME, datetime.timezone.utc)
+
+    def touch(self) -> bool:
+        # Records activity in memory; True when it moved far enough to be written
+        now = time.time()
+        if now - self.last_seen < self.TOUCH_INTERVAL:
+            return False
+        self.seen(now)
+        return True
+
+    @classmethod
+    def activity_ops(cls, sessions: list[dict[str, Any]]) -> list[UpdateOne]:
+        latest = {session["id"]: session for session in sessions}
+        return [
+            UpdateOne({"id": id}, {"$set": {"last_seen": session["last_seen"], "expires_at": session["expires_at"]}})
+            for id, session in latest.items()
+        ]
+
+    @classmethod
+    def stale_query(cls, now: float) -> dict[str, Any]:
+        # Also covers backends without TTL indexes and sessions stored before expires_at existed
+        return {
+            "$or": [
+                {"last_seen": {"$lt": now - cls.EXPIRE_TIME}},
+                {"uid": None, "last_seen": {"$lt": now - cls.ANONYMOUS_EXPIRE_TIME}},
+            ]
+        }
+
+    @classmethod
+    def sweep(cls, db: Database, now: float) -> int:
+        return db[cls.collection_name].delete_many(cls.stale_query(now)).deleted_count
+
+    @classmethod
+    async def asweep(cls, db: AsyncDatabase, now: float) -> int:
+        return (await db[cls.collection_name].delete_many(cls.stale_query(now))).deleted_count
+
     def update(self):
-        self.last_seen = time.time()
+        self.seen(time.time())
         self.save()
+
+    async def aupdate(self):
+        self.seen(time.time())
+        await self.asave()
     
     def login(self, username: str, password: str) -> Union[UserConfigEntry, None]:
         user = UserConfigEntry.load_username(self.db, username)
@@ -41,9 +102,23 @@ class Session(ORM):
             return user
         return None
     
+    async def alogin(self, username: str, password: str) -> Union[UserConfigEntry, None]:
+        user = await UserConfigEntry.aload_username(self.db, username)
+        if not user:
+            return None
+        if await user.averify(password):
+            self.uid = user.id
+            await self.aupdate()
+            return user
+        return None
+    
     def logout(self) -> None:
         self.uid = None
         self.update()
+
+    async def alogout(self) -> None:
+        self.uid = None
+        await self.aupdate()
     
     @property
     def active(self) -> bool:
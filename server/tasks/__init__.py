@@ -1,3 +1,5 @@
 from .ha_status import task_check_status
 from .hass_socket import hass_websocket_manager
-from .data_collection import task_collect_data
\ No newline at end of file
+from .data_collection import task_collect_data, DataLogger
+from .rollup import task_rollup_data
+from .sessions import task_sweep_sessions
\ No newline at end of file
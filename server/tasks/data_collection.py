@@ -1,28 +1,123 @@
 from litestar import Litestar
 from litestar.channels import ChannelsPlugin
-from util import event
-from lowhass import HASS
-from models import DataEntry, EntityConfigEntry
+from pymongo.asynchronous.database import AsyncDatabase
+from util import event, WriteBuffer, AsyncHASS, EntityStateCache, ViewIndex
+from models import DataEntry, EntityConfigEntry, View
+from typing import Any, Literal, Union
 import asyncio
+import logging
+import os
+import time
 
 LOG_INTERVAL = 30
+LOG_MODE: Literal["events", "poll"] = os.getenv("LOG_MODE", "events")
+LOG_HEARTBEAT = float(os.getenv("LOG_HEARTBEAT", 900))  # Rewrite unchanged values after this many seconds, 0 to disable
+
+
+def get_field_value(state: dict[str, Any], field: str) -> Any:
+    if field == "state":
+        return state.get("state", None)
+    return state.get("attributes", {}).get(field, None)
+
+
+class DataLogger:
+    def __init__(self, db: AsyncDatabase, buffer: WriteBuffer):
+        self.db = db
+        self.buffer = buffer
+        self.logged: dict[str, list[str]] = {}
+        self.last_values: dict[tuple[str, str], tuple[Any, float]] = {}
+        self.updates: set[str] = set()
+        self.samples: list[dict[str, Any]] = []
+
+    async def refresh(self) -> list[str]:
+        self.logged = {
+            entity["haid"]: [v["field"] for v in entity["tracked_values"] if v.get("logging", False)]
+            for entity in await EntityConfigEntry.aload_rows(self.db, {"group": "entity"}, {"haid": 1, "tracked_values": 1})
+        }
+        keys = {(eid, field) for eid, fields in self.logged.items() for field in fields}
+        self.last_values = {k: v for k, v in self.last_values.items() if k in keys}
+        return list({eid for eid, field in keys if not (eid, field) in self.last_values})
+
+    def record(self, entity: str, field: str, value: Any, force: bool = False) -> Union[DataEntry, None]:
+        if value == None:
+            return None
+        last = self.last_values.get((entity, field), None)
+        if last and last[0] == value and not force:
+            return None
+        entry = DataEntry(self.db, entity=entity, field=field, time=time.time(), value=value)
+        self.last_values[(entity, field)] = (value, entry.time)
+        self.updates.add(f"{entity}.{field}")
+        self.samples.append(entry.to_dict())
+        return entry
+
+    async def log(self, entity: str, field: str, value: Any, force: bool = False):
+        entry = self.record(entity, field, value, force=force)
+        if entry:
+            await self.buffer.put(entry)
+
+    def handle_state(self, entity: str, state: Union[dict[str, Any], None]):
+        if not state or not entity in self.logged:
+            return
+        for field in self.logged[entity]:
+            entry = self.record(entity, field, get_field_value(state, field))
+            # Runs in the websocket callback, which cannot wait on put(), so a full buffer drops entries
+            if entry:
+                self.buffer.add(entry)
+
+    async def heartbeat(self):
+        if LOG_HEARTBEAT <= 0:
+            return
+        now = time.time()
+        for (entity, field), (value, last_time) in list(self.last_values.items()):
+            if now - last_time >= LOG_HEARTBEAT:
+                await self.log(entity, field, value, force=True)
+
+    def pop_updates(self) -> list[str]:
+        updates = list(self.updates)
+        self.updates.clear()
+        return updates
+
+    def pop_samples(self) -> list[dict[str, Any]]:
+        samples = self.samples
+        self.samples = []
+        return samples
+
 
 async def task_collect_data(app: Litestar, channels: ChannelsPlugin):
+    data_logger: DataLogger = app.state.data_logger
+    entity_states: EntityStateCache = app.state.entity_states
+    view_index: ViewIndex = app.state.view_index
+    indexed = False
     while True:
+        if not indexed:
+            try:
+                view_index.rebuild(await View.aload(data_logger.db, {}))
+                indexed = True
+            except:
+                logging.exception("Failed to load views for live updates:\n")
         try:
-            hass: HASS = app.state.home_assistant
+            hass: AsyncHASS = app.state.home_assistant
             if hass:
-                updates = []
-                all_states = {i.entity_id:i for i in hass.rest.get_states()}
-                tracked_entities = {i.haid:i for i in EntityConfigEntry.all(app.state.db)}
-
-                for eid, entity in tracked_entities.items():
-                    for value in entity.tracked_values:
-                        if "logging" in value.keys() and value["logging"] and eid in all_states:
-                            DataEntry.create(app.state.db, eid, value["field"], (all_states[eid].state if value["field"] == "state" else all_states[eid].attributes[value["field"]]))
-                            updates.append(f"{eid}.{value['field']}")
-                event(channels, "data", {"updates": updates})
-        except SyntaxError:
-            pass
+                unseeded = await data_logger.refresh()
+                if LOG_MODE == "poll":
+                    all_states = {i.entity_id: i.dict() for i in await entity_states.states(hass)}
+                    for eid in data_logger.logged.keys():
+                        if eid in all_states:
+                            for field in data_logger.logged[eid]:
+                                await data_logger.log(eid, field, get_field_value(all_states[eid], field), force=True)
+                else:
+                    for eid in unseeded:
+                        try:
+                            data_logger.handle_state(eid, (await entity_states.state(hass, eid)).dict())
+                        except:
+                            logging.exception(f"Failed to seed logged values for {eid}:\n")
+                    await data_logger.heartbeat()
+                await data_logger.buffer.flush()
+                updates = data_logger.pop_updates()
+                if LOG_MODE == "poll" or len(updates) > 0:
+                    event(channels, "data", {"updates": updates})
+                for view_id, rows in view_index.view_updates(data_logger.pop_samples()).items():
+                    event(channels, "view_data", {"view": view_id, "rows": rows}, key=view_id)
+        except:
+            logging.exception("Failed to collect data:\n")
         await asyncio.sleep(LOG_INTERVAL)
-
@@ -2,23 +2,31 @@ from util import event
 from asyncio import sleep
 from litestar import Litestar
 from litestar.channels import ChannelsPlugin
-from lowhass import HASS
+from util import AsyncHASS, HASSException
 
 async def task_check_status(app: Litestar, channels: ChannelsPlugin):
     while True:
         if app.state.home_assistant:
-            hass: HASS = app.state.home_assistant
+            hass: AsyncHASS = app.state.home_assistant
             try:
                 status = {
                     "online": True,
-                    "config": hass.rest.get_config().dict()
+                    "config": (await hass.rest.get_config()).dict()
+                }
+            except HASSException as exc:
+                status = {
+                    "online": False,
+                    "error": {
+                        "code": exc.status_code,
+                        "description": exc.status_text
+                    }
                 }
             except Exception as exc:
                 status = {
                     "online": False,
                     "error": {
-                        "code": exc.status,
-                        "description": exc.reason
+                        "code": 0,
+                        "description": str(exc)
                     }
                 }
         else:
@@ -1,16 +1,34 @@
 from litestar.channels import ChannelsPlugin
 from litestar import Litestar
-from lowhass import HASS
 import asyncio
-from util import event
+import logging
+from util import AsyncHASS, EntityStateCache, StateFrames
+from .data_collection import DataLogger, LOG_MODE
+
+async def resync_states(app: Litestar, entity_states: EntityStateCache):
+    # The instance is read when the resync runs, since saving the config can replace it
+    hass: AsyncHASS = app.state.home_assistant
+    if not hass:
+        return
+    try:
+        await entity_states.resync(hass)
+    except:
+        logging.exception("Failed to resync entity states:\n")
 
 async def hass_websocket_manager(app: Litestar, channels: ChannelsPlugin, loop: asyncio.AbstractEventLoop):
+    entity_states: EntityStateCache = app.state.entity_states
+    state_frames: StateFrames = app.state.state_frames
+
     def state_handler(data):
-        event(channels, "states", data)
+        entity_states.apply(data["data"])
+        state_frames.put(data["data"]["entity_id"], data["data"]["new_state"])
+        if LOG_MODE == "events":
+            data_logger: DataLogger = app.state.data_logger
+            data_logger.handle_state(data["data"]["entity_id"], data["data"]["new_state"])
 
     while True:
         if app.state.home_assistant:
-            _hass: HASS = app.state.home_assistant
+            _hass: AsyncHASS = app.state.home_assistant
             _addr = _hass.address
             _token = _hass.token
             _hass.ws.handlers = [
@@ -20,8 +38,18 @@ async def hass_websocket_manager(app: Litestar, channels: ChannelsPlugin, loop:
                     "function": state_handler
                 }
             ]
+
+            # lowhass reconnects internally, and every new connection answers the
+            # state_changed subscription with a result message, so resync on those.
+            def connection_handler(data, ws=_hass.ws):
+                if data["type"] == "result":
+                    loop.create_task(resync_states(app, entity_states))
+                type(ws).handler_events(ws, data)
+            _hass.ws.handler_events = connection_handler
+
+            entity_states.clear()
             task: asyncio.Task = loop.create_task(_hass.ws.run())
-            while app.state.home_assistant and app.state.home_assistant.address == _addr and app.state.home_assistant.token == _token:
+            while not task.done() and app.state.home_assistant and app.state.home_assistant.address == _addr and app.state.home_assistant.token == _token:
                 await asyncio.sleep(0.1)
             task.cancel()
-        await asyncio.sleep(1)
\ No newline at end of file
+        await asyncio.sleep(1)
@@ -0,0 +1,21 @@
+from litestar import Litestar
+from models import DataRollup, EntityConfigEntry
+import asyncio
+import logging
+import time
+
+ROLLUP_INTERVAL = 300
+
+async def task_rollup_data(app: Litestar):
+    while True:
+        try:
+            now = time.time()
+            for entity in await EntityConfigEntry.aall(app.state.db):
+                for value in entity.tracked_values:
+                    await DataRollup.aupdate_series(app.state.db, entity.haid, value["field"], now)
+                    if value.get("retention", None):
+                        await DataRollup.aexpire_series(app.state.db, entity.haid, value["field"], value["retention"], now)
+            await DataRollup.aexpire_tiers(app.state.db, now)
+        except:
+            logging.exception("Failed to roll up logged data:\n")
+        await asyncio.sleep(ROLLUP_INTERVAL)
@@ -0,0 +1,17 @@
+from litestar import Litestar
+from models import Session
+import asyncio
+import logging
+import time
+
+SWEEP_INTERVAL = 3600
+
+async def task_sweep_sessions(app: Litestar):
+    while True:
+        try:
+            removed = await Session.asweep(app.state.db, time.time())
+            if removed > 0:
+                logging.info(f"Removed {removed} stale sessions")
+        except:
+            logging.exception("Failed to sweep stale sessions:\n")
+        await asyncio.sleep(SWEEP_INTERVAL)
@@ -0,0 +1,2 @@
+# util has to be imported before models, the same order app.py uses
+import util
@@ -0,0 +1,68 @@
+import asyncio
+from pymongo.errors import AutoReconnect
+import util.write_buffer
+from manage import migrate_buckets
+from models import DataBucket, DataEntry
+from util.storage import AsyncMemoryClient, MemoryClient
+from util.write_buffer import WriteBuffer
+
+START = 1_000_000.0
+
+
+def samples(db, count: int) -> list[dict]:
+    return [DataEntry(db, entity="sensor.power", field="state", time=START + i * 10, value=float(i)).to_dict() for i in range(count)]
+
+
+def test_retried_bucket_append_is_skipped(monkeypatch):
+    monkeypatch.setattr(util.write_buffer, "RETRY_DELAY", 0)
+
+    async def run():
+        db = AsyncMemoryClient()["ham"]
+        await DataBucket.aensure_indexes(db)
+        collection = db[DataBucket.collection_name]
+        write = collection.bulk_write
+        attempts = []
+
+        async def flaky_write(requests, **kwargs):
+            # The first attempt is applied but its reply is lost
+            attempts.append(len(requests))
+            result = await write(requests, **kwargs)
+            if len(attempts) == 1:
+                raise AutoReconnect("reply lost")
+            return result
+
+        collection.bulk_write = flaky_write
+        buffer = WriteBuffer(collection, prepare=DataBucket.append_ops)
+        for sample in samples(db, 30):
+            buffer.add(sample)
+        await buffer.flush()
+        assert len(attempts) == 2
+        buckets = await collection.find({}).to_list(None)
+        assert sum(len(bucket["times"]) for bucket in buckets) == 30
+        assert sum(bucket["count"] for bucket in buckets) == 30
+
+    asyncio.run(run())
+
+
+def test_bucket_tokens_are_capped():
+    db = MemoryClient()["ham"]
+    DataBucket.ensure_indexes(db)
+    for sample in samples(db, 40):
+        db[DataBucket.collection_name].bulk_write(DataBucket.append_ops([sample]))
+    bucket = db[DataBucket.collection_name].find_one({})
+    assert len(bucket["times"]) == 40
+    assert len(bucket["batches"]) == 16
+
+
+def test_interrupted_migration_resumes_without_duplicates():
+    db = MemoryClient()["ham"]
+    db[DataEntry.collection_name].insert_many(samples(db, 50))
+    # An earlier run marked and appended the first 20 samples but stopped before deleting them
+    batch = list(db[DataEntry.collection_name].find({}, {"_id": 0}).limit(20))
+    db[DataEntry.collection_name].update_many({"id": {"$in": [sample["id"] for sample in batch]}}, {"$set": {"migration": "interrupted"}})
+    DataBucket.ensure_indexes(db)
+    db[DataBucket.collection_name].bulk_write(DataBucket.append_ops(batch))
+    migrate_buckets(db, 15, 3600)
+    assert db[DataEntry.collection_name].count_documents({}) == 0
+    buckets = list(db[DataBucket.collection_name].find({}))
+    assert sorted(time for bucket in buckets for time in bucket["times"]) == [START + i * 10 for i in range(50)]
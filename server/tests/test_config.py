@@ -0,0 +1,41 @@
+from models.config import EntityConfigEntry
+
+
+def tracked_entity() -> EntityConfigEntry:
+    return EntityConfigEntry.from_dict(
+        None,
+        {
+            "id": "kitchen",
+            "group": "entity",
+            "last_update": 0,
+            "haid": "sensor.kitchen",
+            "name": "Kitchen",
+            "type": "sensor",
+            "tracked_values": [
+                {"field": "state", "logging": True},
+                {"field": "temperature", "logging": False},
+                {"field": "humidity", "logging": False},
+            ],
+        },
+    )
+
+
+def test_update_tracked_only_touches_its_element():
+    entity = tracked_entity()
+    assert entity.update_tracked("temperature", logging=True)
+    update = entity.changes()
+    assert update == {"$set": {"tracked_values.1.logging": True}}
+    assert all(path.startswith("tracked_values.1.") for path in update["$set"])
+
+
+def test_update_tracked_keeps_order():
+    entity = tracked_entity()
+    entity.update_tracked("state", retention=3600)
+    assert [value["field"] for value in entity.tracked_values] == ["state", "temperature", "humidity"]
+    assert entity.changes() == {"$set": {"tracked_values.0.retention": 3600}}
+
+
+def test_update_tracked_unknown_field():
+    entity = tracked_entity()
+    assert not entity.update_tracked("pressure", logging=True)
+    assert entity.changes() == {}
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from util.query import apply_update, match, run_pipeline
+from util.storage import MemoryClient
+
+
+def test_set_dotted_array_path():
+    document = {"tracked_values": [{"field": "state", "logging": False}, {"field": "temperature", "logging": False}]}
+    apply_update(document, {"$set": {"tracked_values.1.logging": True}})
+    assert document["tracked_values"] == [{"field": "state", "logging": False}, {"field": "temperature", "logging": True}]
+
+
+def test_set_past_array_end_pads_with_none():
+    document = {"values": [1]}
+    apply_update(document, {"$set": {"values.3": 4}})
+    assert document["values"] == [1, None, None, 4]
+
+
+def test_unset_dotted_array_path():
+    document = {"tracked_values": [{"field": "state", "retention": 60}, {"field": "temperature"}]}
+    apply_update(document, {"$unset": {"tracked_values.0.retention": ""}})
+    assert document["tracked_values"][0] == {"field": "state"}
+    apply_update(document, {"$unset": {"tracked_values.1": ""}})
+    assert document["tracked_values"] == [{"field": "state"}, None]
+
+
+def test_date_range_filter():
+    start = datetime(2026, 1, 1)
+    documents = [{"time": start + timedelta(hours=hour)} for hour in range(5)]
+    query = {"time": {"$gte": start + timedelta(hours=1), "$lt": start + timedelta(hours=3)}}
+    assert [document["time"].hour for document in documents if match(document, query)] == [1, 2]
+
+
+def test_date_filter_ignores_other_types():
+    assert not match({"time": "2026-01-01"}, {"time": {"$gte": datetime(2025, 1, 1)}})
+    assert not match({}, {"time": {"$lt": datetime(2030, 1, 1)}})
+
+
+def test_group_first():
+    documents = [
+        {"entity": "sensor.a", "value": 1},
+        {"entity": "sensor.b", "value": 2},
+        {"entity": "sensor.a", "value": 3},
+    ]
+    result = list(run_pipeline(documents, [{"$group": {"_id": "$entity", "value": {"$first": "$value"}, "count": {"$sum": 1}}}], None))
+    assert result == [{"_id": "sensor.a", "value": 1, "count": 2}, {"_id": "sensor.b", "value": 2, "count": 1}]
+
+
+def test_union_with():
+    db = MemoryClient()["ham"]
+    db["data"].insert_many([{"entity": "sensor.a", "value": 1}, {"entity": "sensor.b", "value": 2}])
+    db["rollups"].insert_many([{"entity": "sensor.a", "value": 10}, {"entity": "sensor.b", "value": 20}])
+    result = db["data"].aggregate(
+        [
+            {"$match": {"entity": "sensor.a"}},
+            {"$unionWith": {"coll": "rollups", "pipeline": [{"$match": {"entity": "sensor.a"}}]}},
+            {"$project": {"_id": 0, "value": 1}},
+        ]
+    ).to_list()
+    assert result == [{"value": 1}, {"value": 10}]
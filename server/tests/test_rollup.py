@@ -0,0 +1,63 @@
+import asyncio
+from models import DataEntry, DataRollup, RollupState, View
+from util.storage import AsyncMemoryClient
+
+DAY = 86400
+
+
+def test_views_read_raw_data_for_series_without_rollups():
+    view = View(
+        None,
+        type="linear",
+        fields=[
+            {"entity": "sensor.power", "field": "state", "name": "Power", "color": "#fff"},
+            {"entity": "sensor.mode", "field": "state", "name": "Mode", "color": "#000"},
+        ],
+        range={"mode": "absolute", "start": 0, "end": DAY, "resolution": 3600},
+    )
+    states = [
+        RollupState(None, entity="sensor.power", field="state", watermarks={"minute": DAY / 2, "hour": DAY / 2}, rolled=["minute", "hour"]),
+        RollupState(None, entity="sensor.mode", field="state", watermarks={"minute": DAY / 2, "hour": DAY / 2}, rolled=[]),
+    ]
+    watermarks = view.watermarks(states, "hour")
+    assert watermarks == {("sensor.power", "state"): DAY / 2}
+    raw, rollups = view.source_queries(0, DAY, "hour", watermarks)
+    assert raw == [
+        {"entity": "sensor.power", "field": "state", "time": {"$gte": DAY / 2, "$lte": DAY}},
+        {"entity": "sensor.mode", "field": "state", "time": {"$gte": 0, "$lte": DAY}},
+    ]
+    assert rollups == [{"entity": "sensor.power", "field": "state", "tier": "hour", "time": {"$gte": 0, "$lt": DAY / 2}}]
+
+
+def test_rollups_skip_non_numeric_series():
+    async def run():
+        db = AsyncMemoryClient()["ham"]
+        now = 100 * DAY
+        start = now - DAY
+        rows = []
+        for minute in range(0, 24 * 60, 10):
+            timestamp = start + minute * 60
+            rows.append(DataEntry(db, entity="sensor.power", field="state", time=timestamp, value=float(minute)).to_dict())
+            rows.append(DataEntry(db, entity="sensor.mode", field="state", time=timestamp, value=["off", "heat", "cool"][minute % 3]).to_dict())
+        await db[DataEntry.collection_name].insert_many(rows)
+        for entity in ("sensor.power", "sensor.mode"):
+            await DataRollup.aupdate_series(db, entity, "state", now)
+
+        assert (await RollupState.aload_series(db, "sensor.power", "state")).rolled == ["minute", "hour"]
+        assert (await RollupState.aload_series(db, "sensor.mode", "state")).rolled == []
+
+        view = View(
+            db,
+            type="linear",
+            fields=[
+                {"entity": "sensor.power", "field": "state", "name": "Power", "color": "#fff"},
+                {"entity": "sensor.mode", "field": "state", "name": "Mode", "color": "#000"},
+            ],
+            range={"mode": "absolute", "start": start, "end": now, "resolution": 60},
+        )
+        rows = await view.aget_view_rows()
+        counts = {entity: len([row for row in rows if row["entity"] == entity]) for entity in ("sensor.power", "sensor.mode")}
+        assert counts == {"sensor.power": 144, "sensor.mode": 144}
+        assert all(isinstance(row["value"], str) for row in rows if row["entity"] == "sensor.mode")
+
+    asyncio.run(run())
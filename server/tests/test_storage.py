@@ -0,0 +1,24 @@
+import sqlite3
+from pymongo import DeleteOne, InsertOne
+from util.storage import MemoryClient
+
+
+def test_bulk_write_commits_once(tmp_path):
+    client = MemoryClient(str(tmp_path / "ham.sqlite3"))
+    commits = []
+    client.store.connection.set_trace_callback(lambda statement: commits.append(statement) if statement == "COMMIT" else None)
+    client["ham"]["data"].insert_many([{"entity": "sensor.kitchen", "value": i} for i in range(50)], ordered=False)
+    assert len(commits) == 1
+    client.close()
+    stored = sqlite3.connect(str(tmp_path / "ham.sqlite3")).execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    assert stored == 50
+
+
+def test_bulk_write_persists_final_state(tmp_path):
+    path = str(tmp_path / "ham.sqlite3")
+    client = MemoryClient(path)
+    collection = client["ham"]["data"]
+    collection.bulk_write([InsertOne({"_id": 1, "value": "a"}), InsertOne({"_id": 2, "value": "b"}), DeleteOne({"_id": 1})])
+    client.close()
+    restored = MemoryClient(path)["ham"]["data"]
+    assert list(restored.find({}, {"_id": 0})) == [{"value": "b"}]
@@ -0,0 +1,13 @@
+from models import View
+from util import ViewIndex
+
+
+def test_rebuild_skips_malformed_views():
+    good = View(None, id="good", type="linear", fields=[{"entity": "sensor.a", "field": "state"}], range={"mode": "delta", "start": -3600, "end": 0, "resolution": 0})
+    no_range = View(None, id="no_range", type="linear", fields=[{"entity": "sensor.a", "field": "state"}], range=None)
+    bad_fields = View(None, id="bad_fields", type="linear", fields=[{"name": "A"}], range={"mode": "delta", "start": -3600, "end": 0, "resolution": 0})
+    index = ViewIndex()
+    index.rebuild([no_range, good, bad_fields])
+    assert list(index.views) == ["good"]
+    assert index.series == {("sensor.a", "state"): {"good"}}
+    assert index.view_updates([{"entity": "sensor.a", "field": "state", "time": 1, "value": 2}]) == {"good": [{"entity": "sensor.a", "field": "state", "time": 1, "value": 2}]}
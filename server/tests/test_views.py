@@ -0,0 +1,69 @@
+import asyncio
+from models import DataEntry, View
+from util.storage import AsyncMemoryClient, MemoryClient
+
+START = 1_000_000.0
+SPIKES = {100, 220, 350, 470, 590, 700}
+
+
+def linear_view(db) -> View:
+    return View(
+        db,
+        type="linear",
+        fields=[{"entity": "sensor.power", "field": "state", "name": "Power", "color": "#fff"}],
+        range={"mode": "absolute", "start": START, "end": START + 7200, "resolution": 0},
+    )
+
+
+def switch_view(db, start: float, end: float) -> View:
+    return View(
+        db,
+        type="frequency",
+        fields=[{"entity": "switch.heater", "field": "state", "name": "Heater", "color": "#fff"}],
+        range={"mode": "absolute", "start": start, "end": end, "resolution": 60},
+    )
+
+
+def switch_rows(db) -> list[dict]:
+    # On for the first 10 seconds of every minute, for an hour
+    rows = []
+    for minute in range(60):
+        rows.append(DataEntry(db, entity="switch.heater", field="state", time=START + minute * 60, value="on").to_dict())
+        rows.append(DataEntry(db, entity="switch.heater", field="state", time=START + minute * 60 + 10, value="off").to_dict())
+    return rows
+
+
+def test_reduced_views_keep_spikes():
+    async def run():
+        db = AsyncMemoryClient()["ham"]
+        await db[DataEntry.collection_name].insert_many(
+            [
+                DataEntry(db, entity="sensor.power", field="state", time=START + i * 10, value=100.0 if i in SPIKES else 1.0 + (i % 3) * 0.1).to_dict()
+                for i in range(720)
+            ]
+        )
+        for mode in ("lttb", "minmax"):
+            rows = await linear_view(db).aget_view_rows(50, mode)
+            assert len(rows) <= 50
+            assert sorted(round((row["time"] - START) / 10) for row in rows if row["value"] == 100.0) == sorted(SPIKES)
+
+    asyncio.run(run())
+
+
+def test_bins_weigh_states_by_duration():
+    async def run():
+        db = AsyncMemoryClient()["ham"]
+        await db[DataEntry.collection_name].insert_many(switch_rows(db))
+        bins = await switch_view(db, START, START + 3600).aget_view_bins()
+        assert [(item["keys"], item["counts"], item["durations"]) for item in bins] == [(["off", "on"], [60, 60], [3000.0, 600.0])]
+
+    asyncio.run(run())
+
+
+def test_bins_carry_the_state_before_the_window():
+    db = MemoryClient()["ham"]
+    db[DataEntry.collection_name].insert_many(switch_rows(db))
+    bins = switch_view(db, START + 5, START + 3605).get_view_bins()
+    assert [(item["keys"], item["durations"]) for item in bins] == [(["off", "on"], [3005.0, 595.0])]
+    quiet = switch_view(db, START + 3605, START + 3705).get_view_bins()
+    assert [(item["keys"], item["counts"], item["durations"]) for item in quiet] == [(["off"], [0], [100.0])]
@@ -0,0 +1,40 @@
+import asyncio
+from pymongo.errors import AutoReconnect
+import util.write_buffer
+from util.write_buffer import WriteBuffer
+
+
+class FailingCollection:
+    name = "data"
+
+    def __init__(self):
+        self.attempts = 0
+
+    def insert_many(self, documents, ordered=True):
+        self.attempts += 1
+        raise AutoReconnect("down")
+
+
+def test_add_drops_past_max_pending():
+    async def run():
+        buffer = WriteBuffer(FailingCollection(), max_pending=3)
+        results = [buffer.add({"value": i}) for i in range(5)]
+        assert results == [True, True, True, False, False]
+        assert len(buffer.pending) == 3
+        assert buffer.dropped == 2
+
+    asyncio.run(run())
+
+
+def test_flush_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(util.write_buffer, "RETRY_DELAY", 0)
+
+    async def run():
+        collection = FailingCollection()
+        buffer = WriteBuffer(collection)
+        buffer.add({"value": 1})
+        await buffer.flush()
+        assert collection.attempts == util.write_buffer.MAX_RETRIES
+        assert buffer.pending == [{"value": 1}]
+
+    asyncio.run(run())
@@ -1,6 +1,15 @@
 from .state_management import AppState, dep_app_state
-from .model import ORM
+from .model import ORM, ConcurrentModificationError
 from .error_functions import *
 from .security import *
 from .dependencies import *
-from .eventResponse import ASGISourceResponse, EventSourceResponse, event
\ No newline at end of file
+from .eventResponse import ASGISourceResponse, EventSourceResponse, event
+from .state_frames import StateFrames
+from .write_buffer import WriteBuffer
+from .hass import *
+from .state_cache import EntityStateCache
+from .view_cache import ViewCache
+from .view_index import ViewIndex
+from .session_cache import SessionCache
+from .login_throttle import LoginThrottle
+from .storage import storage_client, async_storage_client
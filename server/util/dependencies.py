@@ -1,15 +1,16 @@
 from models import Session, UserConfigEntry, CoreConfigEntry
 from util import AppState
-from litestar.datastructures import Headers
+from litestar import Request
+from .security import connection_session, connection_user
 
-async def depends_session(app_state: AppState, headers: Headers) -> Session:
-    return Session.load_id(app_state.db, headers["Authorization"])
+async def depends_session(request: Request) -> Session:
+    return await connection_session(request)
 
-async def depends_user(session: Session) -> UserConfigEntry:
-    return session.user
+async def depends_user(request: Request) -> UserConfigEntry:
+    return await connection_user(request)
 
 async def depends_config(app_state: AppState) -> CoreConfigEntry:
     try:
-        return CoreConfigEntry.load(app_state.db)
+        return await CoreConfigEntry.aload(app_state.db)
     except:
         return None
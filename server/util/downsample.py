@@ -0,0 +1,52 @@
+from typing import Literal
+import numpy as np
+
+REDUCE_MODE = Literal["lttb", "minmax"]
+
+
+def lttb(times: np.ndarray, values: np.ndarray, threshold: int) -> np.ndarray:
+    size = len(times)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    # Interior points are split into threshold - 2 equal-count buckets; the
+    # average of each following bucket is precomputed from prefix sums.
+    edges = np.linspace(1, size - 1, threshold - 1).astype(int)
+    starts, ends = edges[:-1], edges[1:]
+    time_sums = np.concatenate(([0.0], np.cumsum(times)))
+    value_sums = np.concatenate(([0.0], np.cumsum(values)))
+    averages_t = (time_sums[ends] - time_sums[starts]) / (ends - starts)
+    averages_v = (value_sums[ends] - value_sums[starts]) / (ends - starts)
+    next_t = np.append(averages_t[1:], times[-1])
+    next_v = np.append(averages_v[1:], values[-1])
+
+    selected = np.empty(threshold, dtype=int)
+    selected[0], selected[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = starts[bucket], ends[bucket]
+        anchor_t, anchor_v = times[previous], values[previous]
+        areas = np.abs(
+            (anchor_t - next_t[bucket]) * (values[start:end] - anchor_v)
+            - (anchor_t - times[start:end]) * (next_v[bucket] - anchor_v)
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(times: np.ndarray, values: np.ndarray, buckets: int) -> np.ndarray:
+    size = len(times)
+    if buckets * 2 >= size or buckets < 1:
+        return np.arange(size)
+
+    edges = np.linspace(0, size, buckets + 1).astype(int)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+    order = np.lexsort((values, bucket_ids))
+    return np.unique(np.concatenate((order[edges[:-1]], order[edges[1:] - 1])))
+
+
+def reduce_series(times: np.ndarray, values: np.ndarray, points: int, mode: REDUCE_MODE = "lttb") -> np.ndarray:
+    if mode == "minmax":
+        return minmax(times, values, points // 2)
+    return lttb(times, values, points)
@@ -2,7 +2,10 @@ from sse_starlette.sse import EventSourceResponse
 from starlette.requests import Request
 from httpagentparser import detect
 import json
+from typing import Union
 from litestar.channels import ChannelsPlugin
+from .topics import topic_index
+from .event_log import LoggedEvent, encode_message, event_log
 
 
 """async def _flush(request: Request):
@@ -42,5 +45,12 @@ def ASGISourceResponse(generator, request: Request, **kwargs) -> EventSourceResp
         **kwargs
     )
 
-def event(channels: ChannelsPlugin, event_type: str, event_data: dict):
-    channels.publish(dict(EventType=event_type, **event_data), ["events"])
\ No newline at end of file
+def publish_event(channels: ChannelsPlugin, event_id: int, event_type: str, event_data: dict, targets: list[str]):
+    channels.publish(encode_message(event_id, dict(EventType=event_type, **event_data)), targets)
+
+def event(channels: ChannelsPlugin, event_type: str, event_data: dict, key: Union[str, None] = None, topic: Union[str, None] = None):
+    # topic defaults to the event type; key is what "topic:pattern" subscriptions match
+    topic = topic if topic else event_type
+    event_id = event_log.next_id()
+    event_log.append(LoggedEvent(event_id, event_type, topic, [(key, event_data)]))
+    publish_event(channels, event_id, event_type, event_data, topic_index.channels(topic, key))
\ No newline at end of file
@@ -0,0 +1,74 @@
+from collections import deque
+from litestar.serialization import encode_json
+from typing import Any, Union
+from .topics import channel_matches
+import os
+import time
+
+EVENT_BUFFER_SIZE = int(os.getenv("EVENT_BUFFER_SIZE", 5000))  # Published events kept for Last-Event-ID replay
+
+
+def encode_message(event_id: int, payload: dict[str, Any]) -> bytes:
+    return f"{event_id}\n".encode() + encode_json(payload)
+
+
+def decode_message(message: bytes) -> tuple[int, str]:
+    event_id, _, data = message.decode().partition("\n")
+    return int(event_id), data
+
+
+class LoggedEvent:
+    # parts holds (key, data) pairs; a grouped event (a state frame) is
+    # rebuilt from the parts a subscriber matches, as {field: [data, ...]}.
+    __slots__ = ("id", "event_type", "topic", "parts", "field")
+
+    def __init__(self, event_id: int, event_type: str, topic: str, parts: list[tuple[Union[str, None], dict[str, Any]]], field: Union[str, None] = None):
+        self.id = event_id
+        self.event_type = event_type
+        self.topic = topic
+        self.parts = parts
+        self.field = field
+
+    def payload(self, subscribed: list[str]) -> Union[dict[str, Any], None]:
+        matched = [data for key, data in self.parts if any(channel_matches(channel, self.topic, key) for channel in subscribed)]
+        if len(matched) == 0:
+            return None
+        return dict(EventType=self.event_type, **(matched[0] if self.field == None else {self.field: matched}))
+
+
+class EventLog:
+    # Ids start from the boot time in microseconds, so ids from before a
+    # restart are always older than the buffer and trigger a resync.
+    def __init__(self, size: int = EVENT_BUFFER_SIZE):
+        self.events: deque[LoggedEvent] = deque(maxlen=size)
+        self.last_id = time.time_ns() // 1000
+        self.floor = self.last_id  # Newest id no longer in the buffer
+
+    def next_id(self) -> int:
+        self.last_id += 1
+        return self.last_id
+
+    def append(self, event: LoggedEvent):
+        if len(self.events) == self.events.maxlen:
+            self.floor = self.events[0].id
+        self.events.append(event)
+
+    def since(self, event_id: int) -> Union[list[LoggedEvent], None]:
+        # None when events after event_id were dropped or the id is unknown
+        if event_id < self.floor or event_id > self.last_id:
+            return None
+        return [event for event in self.events if event.id > event_id]
+
+    def replay(self, subscribed: list[str], event_id: int) -> Union[list[tuple[int, dict[str, Any]]], None]:
+        events = self.since(event_id)
+        if events == None:
+            return None
+        replayed = []
+        for event in events:
+            payload = event.payload(subscribed)
+            if payload:
+                replayed.append((event.id, payload))
+        return replayed
+
+
+event_log = EventLog()
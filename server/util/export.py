@@ -0,0 +1,134 @@
+from typing import Any, AsyncIterator, Iterable, Literal, Union
+import csv
+import io
+import json
+import pyarrow
+import pyarrow.ipc
+import pyarrow.parquet
+
+EXPORT_BATCH = 5000  # Rows encoded per chunk
+EXPORT_FORMAT = Literal["csv", "arrow", "parquet"]
+EXPORT_COLUMNS = ["id", "entity", "field", "time", "value"]
+EXPORT_SCHEMA = pyarrow.schema(
+    [
+        ("id", pyarrow.string()),
+        ("entity", pyarrow.string()),
+        ("field", pyarrow.string()),
+        ("time", pyarrow.float64()),
+        ("value", pyarrow.string()),
+    ]
+)
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_value(value: Any) -> Union[str, None]:
+    if value == None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def batched(rows: Iterable[dict[str, Any]], size: int = EXPORT_BATCH) -> Iterable[list[dict[str, Any]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+async def abatched(rows: AsyncIterator[dict[str, Any]], size: int = EXPORT_BATCH) -> AsyncIterator[list[dict[str, Any]]]:
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if len(batch) > 0:
+        yield batch
+
+
+class ChunkSink:
+    # Write-only file object for pyarrow; drain() hands back whatever was written
+    # since the last call, so encoded batches can be sent as they are produced.
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.size = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self.size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class DataExporter:
+    def __init__(self, format: EXPORT_FORMAT):
+        self.format = format
+        self.sink = ChunkSink()
+        self.writer = None
+        if format == "arrow":
+            self.writer = pyarrow.ipc.new_stream(pyarrow.PythonFile(self.sink, mode="w"), EXPORT_SCHEMA)
+        elif format == "parquet":
+            self.writer = pyarrow.parquet.ParquetWriter(pyarrow.PythonFile(self.sink, mode="w"), EXPORT_SCHEMA)
+        else:
+            self.sink.write(self.encode_csv([EXPORT_COLUMNS]))
+
+    @staticmethod
+    def encode_csv(lines: list[list[Any]]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(lines)
+        return buffer.getvalue().encode()
+
+    def write(self, rows: list[dict[str, Any]]) -> bytes:
+        if self.writer == None:
+            self.sink.write(
+                self.encode_csv(
+                    [[row["id"], row["entity"], row["field"], row["time"], export_value(row["value"])] for row in rows]
+                )
+            )
+        else:
+            self.writer.write_table(
+                pyarrow.Table.from_pydict(
+                    {
+                        "id": [row["id"] for row in rows],
+                        "entity": [row["entity"] for row in rows],
+                        "field": [row["field"] for row in rows],
+                        "time": [float(row["time"]) for row in rows],
+                        "value": [export_value(row["value"]) for row in rows],
+                    },
+                    schema=EXPORT_SCHEMA,
+                )
+            )
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        if self.writer != None:
+            self.writer.close()
+        return self.sink.drain()
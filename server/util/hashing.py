@@ -0,0 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union
+import asyncio
+import hashlib
+import os
+import time
+
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", 2))  # Password hashes computed at once
+HASH_ITERS = 500000
+
+
+def hash_password(password: str, salt: bytes) -> str:
+    return hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, HASH_ITERS).hex()
+
+
+class PasswordHasher:
+    # pbkdf2_hmac releases the GIL, so worker threads hash in parallel while
+    # the event loop keeps serving; the semaphore queues callers beyond the cap.
+    def __init__(self, workers: int = HASH_WORKERS):
+        self.workers = workers
+        self.executor: Union[ThreadPoolExecutor, None] = None
+        self.semaphore: Union[asyncio.Semaphore, None] = None
+        self.active = 0
+        self.waiting = 0
+        self.completed = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hash_total = 0.0
+
+    async def hash(self, password: str, salt: bytes) -> str:
+        if self.executor == None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            self.semaphore = asyncio.Semaphore(self.workers)
+        queued = time.monotonic()
+        self.waiting += 1
+        try:
+            await self.semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.monotonic()
+        self.wait_total += started - queued
+        self.wait_max = max(self.wait_max, started - queued)
+        self.active += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, hash_password, password, salt)
+        finally:
+            self.active -= 1
+            self.completed += 1
+            self.hash_total += time.monotonic() - started
+            self.semaphore.release()
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "workers": self.workers,
+            "active": self.active,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "wait_avg": self.wait_total / self.completed if self.completed else 0.0,
+            "wait_max": self.wait_max,
+            "hash_avg": self.hash_total / self.completed if self.completed else 0.0,
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,103 @@
+from lowhass import HASS_WS, Config, Domain, State
+from lowhass.util import HASSException
+from typing import Any, Optional, Union
+import asyncio
+import httpx
+
+REQUEST_TIMEOUT = 10
+MAX_CONNECTIONS = 16
+MAX_CONCURRENCY = 8
+
+__all__ = ["AsyncHASS", "AsyncHASSRest", "HASSException", "replace_hass"]
+
+
+class AsyncHASSRest:
+    def __init__(
+        self,
+        address: str,
+        token: str,
+        timeout: float = REQUEST_TIMEOUT,
+        max_connections: int = MAX_CONNECTIONS,
+        max_concurrency: int = MAX_CONCURRENCY,
+    ) -> None:
+        self.address = address
+        self.token = token
+        self.client = httpx.AsyncClient(
+            base_url=f"{address}/api",
+            headers={"Authorization": "Bearer " + token},
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def request(
+        self, method: str, endpoint: str, timeout: Optional[float] = None, **kwargs
+    ) -> Any:
+        async with self.semaphore:
+            try:
+                response = await self.client.request(
+                    method,
+                    endpoint,
+                    timeout=timeout if timeout else httpx.USE_CLIENT_DEFAULT,
+                    **kwargs
+                )
+            except httpx.HTTPError as exc:
+                raise HASSException(0, type(exc).__name__, str(exc))
+        if response.status_code < 400:
+            try:
+                return response.json()
+            except:
+                return response.text
+        else:
+            raise HASSException(response.status_code, response.reason_phrase, response.text)
+
+    async def get_config(self, timeout: Optional[float] = None) -> Config:
+        return Config(**(await self.request("GET", "/config", timeout=timeout)))
+
+    async def get_services(self, timeout: Optional[float] = None) -> list[Domain]:
+        return [Domain(**d) for d in await self.request("GET", "/services", timeout=timeout)]
+
+    async def get_states(self, timeout: Optional[float] = None) -> list[State]:
+        return [State(**s) for s in await self.request("GET", "/states", timeout=timeout)]
+
+    async def get_state(self, entity: str, timeout: Optional[float] = None) -> State:
+        return State(**(await self.request("GET", f"/states/{entity}", timeout=timeout)))
+
+    async def call_service(
+        self,
+        domain: str,
+        service: str,
+        data: Optional[dict] = {},
+        timeout: Optional[float] = None,
+    ) -> list[State]:
+        return [
+            State(**s)
+            for s in await self.request(
+                "POST", f"/services/{domain}/{service}", timeout=timeout, json=data
+            )
+        ]
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class AsyncHASS:
+    def __init__(self, address: str, token: str):
+        self.address = address
+        self.token = token
+        self.rest = AsyncHASSRest(address, token)
+        self.ws = HASS_WS(address, token)
+
+    async def close(self):
+        await self.rest.close()
+
+
+async def replace_hass(
+    current: Union[AsyncHASS, None], address: str, token: str
+) -> AsyncHASS:
+    if current:
+        await current.close()
+    return AsyncHASS(address, token)
@@ -0,0 +1,57 @@
+from collections import deque
+from typing import Union
+import os
+import time
+
+LOGIN_WINDOW = float(os.getenv("LOGIN_WINDOW", 300))  # Seconds attempts are counted over
+LOGIN_MAX_USER = int(os.getenv("LOGIN_MAX_USER", 5))  # Attempts per username within the window
+LOGIN_MAX_ADDRESS = int(os.getenv("LOGIN_MAX_ADDRESS", 20))  # Attempts per client address within the window
+LOGIN_PRUNE_SIZE = 10000  # Idle keys are dropped once this many are tracked
+
+
+class LoginThrottle:
+    # Attempts are counted when they start, so a concurrent burst is capped
+    # before any of it reaches the password hasher.
+    def __init__(self, window: float = LOGIN_WINDOW, max_user: int = LOGIN_MAX_USER, max_address: int = LOGIN_MAX_ADDRESS):
+        self.window = window
+        self.max_user = max_user
+        self.max_address = max_address
+        self.attempts: dict[str, deque[float]] = {}
+
+    def limits(self, username: str, address: Union[str, None]) -> dict[str, int]:
+        limits = {f"user:{username.lower()}": self.max_user}
+        if address:
+            limits[f"address:{address}"] = self.max_address
+        return limits
+
+    def recent(self, key: str, now: float) -> deque[float]:
+        attempts = self.attempts.get(key, deque())
+        while len(attempts) > 0 and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if len(attempts) == 0:
+            self.attempts.pop(key, None)
+        return attempts
+
+    def attempt(self, username: str, address: Union[str, None]) -> float:
+        # Records an attempt and returns 0, or the seconds to wait when over a limit
+        now = time.monotonic()
+        if len(self.attempts) >= LOGIN_PRUNE_SIZE:
+            self.prune(now)
+        limits = self.limits(username, address)
+        wait = 0.0
+        for key, limit in limits.items():
+            attempts = self.recent(key, now)
+            if len(attempts) >= limit:
+                wait = max(wait, attempts[len(attempts) - limit] + self.window - now)
+        if wait > 0:
+            return wait
+        for key in limits.keys():
+            self.attempts.setdefault(key, deque()).append(now)
+        return 0.0
+
+    def succeeded(self, username: str):
+        self.attempts.pop(f"user:{username.lower()}", None)
+
+    def prune(self, now: float):
+        for key in list(self.attempts.keys()):
+            self.recent(key, now)
@@ -1,36 +1,229 @@
-from pymongo.database import Database
+from pymongo import IndexModel, ASCENDING
+from pymongo.errors import OperationFailure
 from uuid import uuid4
-from typing import Any
+from typing import Any, Union
+import copy
+import inspect
+import logging
+from .storage import AsyncStorageDatabase, StorageDatabase
+
+INDEX_OPTIONS = ["unique", "sparse", "expireAfterSeconds", "partialFilterExpression"]
+
+
+class ConcurrentModificationError(Exception):
+    def __init__(self, model: str, id: str):
+        super().__init__(f"{model} {id} was modified or removed since it was loaded")
+        self.model = model
+        self.id = id
+
+
+def snapshot_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: snapshot_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [snapshot_value(item) for item in value]
+    return value
+
+
+def path_key(key: Any) -> bool:
+    return isinstance(key, str) and len(key) > 0 and not "." in key and not key.startswith("$")
+
+
+def diff_value(path: str, old: Any, new: Any, sets: dict[str, Any], unsets: dict[str, str]):
+    if type(old) is type(new) and old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict) and all(path_key(key) for key in [*old.keys(), *new.keys()]):
+        for key, value in new.items():
+            if key in old:
+                diff_value(f"{path}.{key}", old[key], value, sets, unsets)
+            else:
+                sets[f"{path}.{key}"] = value
+        for key in old.keys():
+            if not key in new:
+                unsets[f"{path}.{key}"] = ""
+    elif isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        for index, (before, after) in enumerate(zip(old, new)):
+            diff_value(f"{path}.{index}", before, after, sets, unsets)
+    else:
+        sets[path] = new
+
 
 class ORM:
+    __slots__ = ("db", "id", "snapshot")
     collection_name: str
+    indexes: list[IndexModel] = [IndexModel([("id", ASCENDING)], unique=True)]
+    document_fields: dict[str, Any] = {"id": None}  # Stored field -> default, built from __slots__
+    version_field: Union[str, None] = None  # Checked against the loaded value on save
 
-    def __init__(self, db: Database, id: str = None, **kwargs):
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not "__slots__" in cls.__dict__:
+            raise TypeError(f"{cls.__name__} must declare __slots__ so its fields are stored")
+        parameters = inspect.signature(cls.__init__).parameters
+        cls.document_fields = {
+            **cls.document_fields,
+            **{
+                name: parameters[name].default
+                if name in parameters and parameters[name].default is not inspect.Parameter.empty
+                else None
+                for name in cls.__slots__
+            },
+        }
+
+    def __init__(self, db: Union[StorageDatabase, AsyncStorageDatabase], id: str = None, **kwargs):
         self.db = db
-        self.collection = db[self.collection_name]
         self.id = id if id else uuid4().hex
+        self.snapshot: Union[dict[str, Any], None] = None  # Stored values as last loaded or saved, None until then
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
 
     def to_dict(self) -> dict[str, Any]:
-        return {k:v for k, v in self.__dict__.items() if not k in ["collection", "db"]}
-    
+        return {name: getattr(self, name) for name in self.document_fields}
+
     @classmethod
-    def from_dict(cls, db: Database, data: dict[str, Any]):
-        return cls(db, **data)
-    
+    def from_dict(cls, db: Union[StorageDatabase, AsyncStorageDatabase], data: dict[str, Any]):
+        # Hydrates stored documents without going through __init__
+        entity = cls.__new__(cls)
+        entity.db = db
+        for name, default in cls.document_fields.items():
+            setattr(entity, name, data[name] if name in data else copy.copy(default))
+        # Fields missing from the stored document stay out of the snapshot so the next save writes them
+        entity.snapshot = {name: snapshot_value(data[name]) for name in cls.document_fields if name in data}
+        return entity
+
+    def changes(self) -> dict[str, dict[str, Any]]:
+        sets: dict[str, Any] = {}
+        unsets: dict[str, str] = {}
+        for name, default in self.document_fields.items():
+            value = getattr(self, name)
+            if not name in self.snapshot:
+                sets[name] = value
+            elif value == None and default == None:
+                if self.snapshot[name] != None:
+                    unsets[name] = ""
+            else:
+                diff_value(name, self.snapshot[name], value, sets, unsets)
+        return {operator: fields for operator, fields in (("$set", sets), ("$unset", unsets)) if len(fields) > 0}
+
+    def update_filter(self) -> dict[str, Any]:
+        query = {"id": self.id}
+        if self.version_field:
+            query[self.version_field] = self.snapshot.get(self.version_field, {"$exists": False})
+        return query
+
+    def check_update(self, matched: int):
+        # Unversioned documents that were deleted meanwhile are left deleted rather than recreated
+        if matched == 0 and self.version_field:
+            raise ConcurrentModificationError(type(self).__name__, self.id)
+        self.snapshot = snapshot_value(self.to_dict())
+
     @classmethod
-    def load(cls, db: Database, query: dict) -> list:
+    def load(cls, db: StorageDatabase, query: dict) -> list:
         return [cls.from_dict(db, item) for item in db[cls.collection_name].find(query)]
-    
-    @classmethod
-    def load_id(cls, db: Database, id: str):
-        result = cls.load(db, {"id": id})
-        if len(result) > 0:
-            return result[0]
-        else:
-            return None
-    
+
+    @classmethod
+    def load_id(cls, db: StorageDatabase, id: str):
+        result = db[cls.collection_name].find_one({"id": id})
+        return cls.from_dict(db, result) if result else None
+
+    @classmethod
+    def load_rows(cls, db: StorageDatabase, query: dict, projection: dict[str, int] = None) -> list[dict[str, Any]]:
+        return list(db[cls.collection_name].find(query, {"_id": 0, **(projection if projection else {})}))
+
     def save(self):
-        self.collection.replace_one({"id": self.id}, self.to_dict(), upsert=True)
-    
+        if self.snapshot == None:
+            self.collection.replace_one({"id": self.id}, self.to_dict(), upsert=True)
+            self.snapshot = snapshot_value(self.to_dict())
+            return
+        update = self.changes()
+        if len(update) > 0:
+            self.check_update(self.collection.update_one(self.update_filter(), update).matched_count)
+
     def destroy(self):
         self.collection.delete_one({"id": self.id})
+
+    @classmethod
+    async def aload(cls, db: AsyncStorageDatabase, query: dict) -> list:
+        return [cls.from_dict(db, item) async for item in db[cls.collection_name].find(query)]
+
+    @classmethod
+    async def aload_id(cls, db: AsyncStorageDatabase, id: str):
+        result = await db[cls.collection_name].find_one({"id": id})
+        return cls.from_dict(db, result) if result else None
+
+    @classmethod
+    async def aload_rows(cls, db: AsyncStorageDatabase, query: dict, projection: dict[str, int] = None) -> list[dict[str, Any]]:
+        return await db[cls.collection_name].find(query, {"_id": 0, **(projection if projection else {})}).to_list(None)
+
+    async def asave(self):
+        if self.snapshot == None:
+            await self.collection.replace_one({"id": self.id}, self.to_dict(), upsert=True)
+            self.snapshot = snapshot_value(self.to_dict())
+            return
+        update = self.changes()
+        if len(update) > 0:
+            self.check_update((await self.collection.update_one(self.update_filter(), update)).matched_count)
+
+    async def adestroy(self):
+        await self.collection.delete_one({"id": self.id})
+
+    @classmethod
+    def check_indexes(cls, existing: dict[str, dict[str, Any]]) -> tuple[list[IndexModel], list[str]]:
+        missing: list[IndexModel] = []
+        conflicts: list[str] = []
+        existing_keys = {tuple(info["key"]): name for name, info in existing.items()}
+        for index in cls.indexes:
+            declared = index.document
+            keys = tuple(declared["key"].items())
+            name = existing_keys.get(keys, declared["name"])
+            if not name in existing:
+                missing.append(index)
+                continue
+            differences = [
+                option
+                for option in INDEX_OPTIONS
+                if declared.get(option, None) != existing[name].get(option, None)
+            ]
+            if name != declared["name"] or len(differences) > 0:
+                conflicts.append(
+                    f"{cls.collection_name}.{name} conflicts with declared {declared['name']}"
+                    + (f" ({', '.join(differences)})" if len(differences) > 0 else "")
+                )
+        return missing, conflicts
+
+    @classmethod
+    def report_indexes(cls, created: list[IndexModel], conflicts: list[str]):
+        for index in created:
+            logging.warning(f"Created missing index {cls.collection_name}.{index.document['name']}")
+        for conflict in conflicts:
+            logging.error(f"Index conflict: {conflict}")
+
+    @classmethod
+    def ensure_indexes(cls, db: StorageDatabase) -> tuple[list[IndexModel], list[str]]:
+        collection = db[cls.collection_name]
+        missing, conflicts = cls.check_indexes(collection.index_information())
+        created = []
+        for index in missing:
+            try:
+                collection.create_indexes([index])
+                created.append(index)
+            except OperationFailure as exc:
+                conflicts.append(f"{cls.collection_name}.{index.document['name']} could not be created: {exc}")
+        cls.report_indexes(created, conflicts)
+        return created, conflicts
+
+    @classmethod
+    async def aensure_indexes(cls, db: AsyncStorageDatabase) -> tuple[list[IndexModel], list[str]]:
+        collection = db[cls.collection_name]
+        missing, conflicts = cls.check_indexes(await collection.index_information())
+        created = []
+        for index in missing:
+            try:
+                await collection.create_indexes([index])
+                created.append(index)
+            except OperationFailure as exc:
+                conflicts.append(f"{cls.collection_name}.{index.document['name']} could not be created: {exc}")
+        cls.report_indexes(created, conflicts)
+        return created, conflicts
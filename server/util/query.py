@@ -0,0 +1,406 @@
+from datetime import datetime
+from itertools import chain
+from pymongo.errors import OperationFailure
+from typing import Any, Callable, Iterable
+import math
+
+# Evaluates the subset of MongoDB queries, updates and aggregation stages used
+# by the models against plain documents, for the in-process storage backend.
+
+MISSING = object()
+
+
+def copy_document(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: copy_document(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [copy_document(item) for item in value]
+    return value
+
+
+def get_path(document: Any, path: str) -> Any:
+    value = document
+    for part in path.split("."):
+        if isinstance(value, dict):
+            value = value.get(part, MISSING)
+        elif isinstance(value, list) and part.isdigit():
+            value = value[int(part)] if int(part) < len(value) else MISSING
+        else:
+            return MISSING
+        if value is MISSING:
+            return MISSING
+    return value
+
+
+def set_path(document: dict, path: str, value: Any):
+    parts = path.split(".")
+    target = document
+    for part in parts[:-1]:
+        if isinstance(target, list):
+            target = target[int(part)]
+        else:
+            target = target.setdefault(part, {})
+    if isinstance(target, list):
+        index = int(parts[-1])
+        target.extend([None] * (index + 1 - len(target)))
+        target[index] = value
+    else:
+        target[parts[-1]] = value
+
+
+def unset_path(document: dict, path: str):
+    parts = path.split(".")
+    target = get_path(document, ".".join(parts[:-1])) if len(parts) > 1 else document
+    if isinstance(target, dict):
+        target.pop(parts[-1], None)
+    elif isinstance(target, list) and parts[-1].isdigit() and int(parts[-1]) < len(target):
+        target[int(parts[-1])] = None
+
+
+def freeze(value: Any) -> Any:
+    # Hashable stand-in for grouping and index keys
+    if isinstance(value, dict):
+        return ("dict", tuple((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return ("list", tuple(freeze(item) for item in value))
+    if value is MISSING:
+        return None
+    return value
+
+
+def type_rank(value: Any) -> int:
+    # BSON comparison order for the types documents here can hold
+    if value is None or value is MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, list):
+        return 5
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def sort_key(value: Any) -> tuple:
+    rank = type_rank(value)
+    if rank in (2, 3, 8, 9):
+        return (rank, value)
+    if rank == 1:
+        return (rank, 0)
+    return (rank, repr(freeze(value)))
+
+
+def values_equal(value: Any, other: Any) -> bool:
+    if value is MISSING:
+        return other == None
+    if isinstance(value, bool) != isinstance(other, bool):
+        return False
+    return value == other
+
+
+def comparable(value: Any, other: Any) -> bool:
+    return value is not MISSING and type_rank(value) == type_rank(other) and type_rank(value) in (2, 3, 9)
+
+
+def candidates(value: Any) -> list[Any]:
+    # Array fields match a condition when the array or any element does
+    return [value, *value] if isinstance(value, list) else [value]
+
+
+QUERY_OPERATORS: dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, arg: any(values_equal(item, arg) for item in candidates(value)),
+    "$ne": lambda value, arg: not any(values_equal(item, arg) for item in candidates(value)),
+    "$in": lambda value, arg: any(values_equal(item, option) for item in candidates(value) for option in arg),
+    "$nin": lambda value, arg: not any(values_equal(item, option) for item in candidates(value) for option in arg),
+    "$gt": lambda value, arg: any(comparable(item, arg) and item > arg for item in candidates(value)),
+    "$gte": lambda value, arg: any(comparable(item, arg) and item >= arg for item in candidates(value)),
+    "$lt": lambda value, arg: any(comparable(item, arg) and item < arg for item in candidates(value)),
+    "$lte": lambda value, arg: any(comparable(item, arg) and item <= arg for item in candidates(value)),
+    "$exists": lambda value, arg: (value is not MISSING) == bool(arg),
+}
+
+
+def is_operator_condition(condition: Any) -> bool:
+    return isinstance(condition, dict) and len(condition) > 0 and all(key.startswith("$") for key in condition)
+
+
+def match_condition(value: Any, condition: Any) -> bool:
+    if not is_operator_condition(condition):
+        return QUERY_OPERATORS["$eq"](value, condition)
+    for operator, arg in condition.items():
+        if not operator in QUERY_OPERATORS:
+            raise OperationFailure(f"unknown operator: {operator}")
+        if not QUERY_OPERATORS[operator](value, arg):
+            return False
+    return True
+
+
+def match(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(match(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(match(document, branch) for branch in condition):
+                return False
+        elif key == "$nor":
+            if any(match(document, branch) for branch in condition):
+                return False
+        elif not match_condition(get_path(document, key), condition):
+            return False
+    return True
+
+
+def to_string(value: Any) -> Any:
+    if value == None:
+        return None
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def array_element(values: Any, index: Any) -> Any:
+    if not isinstance(values, list) or index == None:
+        return None
+    index = int(index)
+    return values[index] if -len(values) <= index < len(values) else None
+
+
+def set_union(*arrays: Any) -> Any:
+    if any(array == None for array in arrays):
+        return None
+    return list({freeze(item): item for array in arrays for item in array}.values())
+
+
+def arithmetic(operation: Callable[..., Any]) -> Callable[..., Any]:
+    def evaluate_arithmetic(*args):
+        return None if any(arg == None for arg in args) else operation(*args)
+
+    return evaluate_arithmetic
+
+
+EXPRESSIONS: dict[str, Callable[..., Any]] = {
+    "$concat": lambda *args: None if any(arg == None for arg in args) else "".join(args),
+    "$toString": to_string,
+    "$arrayElemAt": array_element,
+    "$setUnion": set_union,
+    "$floor": arithmetic(math.floor),
+    "$divide": arithmetic(lambda left, right: left / right),
+    "$multiply": arithmetic(lambda left, right: left * right),
+    "$add": arithmetic(lambda left, right: left + right),
+    "$subtract": arithmetic(lambda left, right: left - right),
+}
+
+
+def evaluate(document: dict, expression: Any) -> Any:
+    if expression == "$$ROOT":
+        return document
+    if isinstance(expression, str) and expression.startswith("$"):
+        value = get_path(document, expression[1:])
+        return None if value is MISSING else value
+    if is_operator_condition(expression) and len(expression) == 1:
+        operator, args = next(iter(expression.items()))
+        if not operator in EXPRESSIONS:
+            raise OperationFailure(f"unknown expression: {operator}")
+        args = args if isinstance(args, list) else [args]
+        return EXPRESSIONS[operator](*[evaluate(document, arg) for arg in args])
+    if isinstance(expression, dict):
+        return {key: evaluate(document, item) for key, item in expression.items()}
+    if isinstance(expression, list):
+        return [evaluate(document, item) for item in expression]
+    return expression
+
+
+def project(document: dict, projection: dict, expressions: bool = False) -> dict:
+    fields = {key: spec for key, spec in projection.items() if key != "_id"}
+    inclusive = any(not spec in (0, False) for spec in fields.values())
+    if inclusive:
+        result = {}
+        if projection.get("_id", 1) not in (0, False) and "_id" in document:
+            result["_id"] = document["_id"]
+        for key, spec in fields.items():
+            if spec is True or (type(spec) is int and spec == 1):
+                value = get_path(document, key)
+                if value is not MISSING:
+                    set_path(result, key, copy_document(value))
+            elif expressions:
+                set_path(result, key, evaluate(document, spec))
+            else:
+                raise OperationFailure(f"unsupported projection for {key}")
+        return result
+    result = copy_document(document)
+    for key, spec in projection.items():
+        unset_path(result, key)
+    return result
+
+
+def push_values(document: dict, path: str, spec: Any):
+    current = get_path(document, path)
+    items = spec["$each"] if isinstance(spec, dict) and "$each" in spec else [spec]
+    if current is MISSING:
+        current = []
+        set_path(document, path, current)
+    elif not isinstance(current, list):
+        raise OperationFailure(f"the field {path} must be an array")
+    current.extend(copy_document(items))
+    if isinstance(spec, dict) and "$slice" in spec:
+        current[:] = current[spec["$slice"]:] if spec["$slice"] < 0 else current[: spec["$slice"]]
+
+
+def increment(document: dict, path: str, amount: Any):
+    current = get_path(document, path)
+    set_path(document, path, amount if current is MISSING else current + amount)
+
+
+def apply_update(document: dict, update: dict, inserting: bool = False):
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            if operator == "$set":
+                set_path(document, path, copy_document(value))
+            elif operator == "$setOnInsert":
+                if inserting:
+                    set_path(document, path, copy_document(value))
+            elif operator == "$unset":
+                unset_path(document, path)
+            elif operator == "$inc":
+                increment(document, path, value)
+            elif operator == "$push":
+                push_values(document, path, value)
+            else:
+                raise OperationFailure(f"unknown update operator: {operator}")
+
+
+def upsert_document(query: dict, update: dict) -> dict:
+    # New documents start from the equality conditions of the filter
+    document = {}
+    for key, condition in query.items():
+        if not key.startswith("$") and not is_operator_condition(condition):
+            set_path(document, key, copy_document(condition))
+        elif is_operator_condition(condition) and "$eq" in condition:
+            set_path(document, key, copy_document(condition["$eq"]))
+    apply_update(document, update, inserting=True)
+    return document
+
+
+def sort_documents(documents: Iterable[dict], order: list[tuple[str, int]]) -> list[dict]:
+    result = list(documents)
+    for field, direction in reversed(order):
+        result.sort(key=lambda document: sort_key(get_path(document, field)), reverse=direction < 0)
+    return result
+
+
+def unwind(documents: Iterable[dict], spec: Any) -> Iterable[dict]:
+    spec = spec if isinstance(spec, dict) else {"path": spec}
+    path = spec["path"][1:]
+    index_field = spec.get("includeArrayIndex", None)
+    for document in documents:
+        values = get_path(document, path)
+        if not isinstance(values, list) or len(values) == 0:
+            if spec.get("preserveNullAndEmptyArrays", False):
+                yield document
+            elif values is not MISSING and values != None and not isinstance(values, list):
+                yield {**document, **({index_field: None} if index_field else {})}
+            continue
+        for index, value in enumerate(values):
+            unwound = {**document}
+            set_path(unwound, path, value)
+            if index_field:
+                unwound[index_field] = index
+            yield unwound
+
+
+def accumulate(operator: str, values: list[Any]) -> Any:
+    present = [value for value in values if value != None]
+    if operator == "$first":
+        return values[0]
+    if operator == "$last":
+        return values[-1]
+    if operator == "$push":
+        return values
+    if operator == "$sum":
+        return sum(value for value in present if type_rank(value) == 2)
+    if operator == "$avg":
+        numbers = [value for value in present if type_rank(value) == 2]
+        return sum(numbers) / len(numbers) if len(numbers) > 0 else None
+    if operator == "$min":
+        return min(present, key=sort_key) if len(present) > 0 else None
+    if operator == "$max":
+        return max(present, key=sort_key) if len(present) > 0 else None
+    raise OperationFailure(f"unknown group operator: {operator}")
+
+
+def group(documents: Iterable[dict], spec: dict) -> Iterable[dict]:
+    groups: dict[Any, tuple[Any, list[dict]]] = {}
+    for document in documents:
+        key = evaluate(document, spec["_id"])
+        groups.setdefault(freeze(key), (key, []))[1].append(document)
+    for key, members in groups.values():
+        result = {"_id": key}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            operator, expression = next(iter(accumulator.items()))
+            result[field] = accumulate(operator, [evaluate(member, expression) for member in members])
+        yield result
+
+
+def replace_root_stage(documents: Iterable[dict], spec: dict) -> Iterable[dict]:
+    for document in documents:
+        root = evaluate(document, spec["newRoot"])
+        if not isinstance(root, dict):
+            raise OperationFailure("$replaceRoot needs newRoot to be a document")
+        yield root
+
+
+def match_stage(documents: Iterable[dict], query: dict) -> Iterable[dict]:
+    return (document for document in documents if match(document, query))
+
+
+def project_stage(documents: Iterable[dict], projection: dict) -> Iterable[dict]:
+    return (project(document, projection, expressions=True) for document in documents)
+
+
+def set_stage(documents: Iterable[dict], fields: dict) -> Iterable[dict]:
+    return ({**document, **evaluate(document, fields)} for document in documents)
+
+
+def run_pipeline(
+    documents: Iterable[dict],
+    pipeline: list[dict],
+    union: Callable[[str, list[dict]], Iterable[dict]],
+) -> Iterable[dict]:
+    # Stages are chained lazily; $sort, $group, $skip and $limit materialize
+    for stage in pipeline:
+        name, spec = next(iter(stage.items()))
+        if name == "$match":
+            documents = match_stage(documents, spec)
+        elif name == "$project":
+            documents = project_stage(documents, spec)
+        elif name in ("$set", "$addFields"):
+            documents = set_stage(documents, spec)
+        elif name == "$sort":
+            documents = sort_documents(documents, list(spec.items()))
+        elif name == "$skip":
+            documents = list(documents)[spec:]
+        elif name == "$limit":
+            documents = list(documents)[:spec]
+        elif name == "$unwind":
+            documents = unwind(documents, spec)
+        elif name == "$group":
+            documents = group(documents, spec)
+        elif name == "$replaceRoot":
+            documents = replace_root_stage(documents, spec)
+        elif name == "$unionWith":
+            spec = spec if isinstance(spec, dict) else {"coll": spec}
+            documents = chain(documents, union(spec["coll"], spec.get("pipeline", [])))
+        else:
+            raise OperationFailure(f"unsupported pipeline stage: {name}")
+    return documents
@@ -0,0 +1,56 @@
+from datetime import datetime
+from typing import Any, Iterable, TextIO
+import csv
+import json
+
+READ_CHUNK = 1 << 20  # Characters read from an export at a time
+
+
+def parse_time(value: str) -> float:
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+def history_states(stream: TextIO) -> Iterable[dict[str, Any]]:
+    # History API exports are a single array of per-entity state arrays, so
+    # decode one state object at a time instead of loading the whole document.
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    entity_id = None
+    while True:
+        while position < len(buffer) and buffer[position] in "[], \t\r\n":
+            position += 1
+        if position >= len(buffer):
+            buffer = stream.read(READ_CHUNK)
+            position = 0
+            if not buffer:
+                return
+            continue
+        try:
+            state, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = stream.read(READ_CHUNK)
+            if not chunk:
+                raise
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        # Minimal responses only name the entity on its first state
+        entity_id = state.get("entity_id", entity_id)
+        yield {
+            "entity_id": entity_id,
+            "state": state.get("state", None),
+            "attributes": state.get("attributes", {}),
+            "time": parse_time(state.get("last_updated", state.get("last_changed"))),
+        }
+
+
+def csv_states(stream: TextIO) -> Iterable[dict[str, Any]]:
+    # Matches the history panel download: entity_id,state,last_changed
+    for row in csv.DictReader(stream):
+        yield {
+            "entity_id": row["entity_id"],
+            "state": row["state"],
+            "attributes": {},
+            "time": parse_time(row["last_changed"]),
+        }
@@ -3,30 +3,59 @@ from litestar.connection import ASGIConnection
 from litestar.handlers.base import BaseRouteHandler
 from litestar.exceptions import *
 from .error_functions import construct_detail
+from .session_cache import SessionCache
+from typing import Union
+import math
 
-def guard_hasSession(connection: ASGIConnection, _: BaseRouteHandler) -> None:
+async def connection_session(connection: ASGIConnection) -> Union[Session, None]:
+    # Resolved once per request; guards and dependencies share it through connection.state
+    if not "session" in connection.state:
+        token = connection.headers.get("Authorization", "null")
+        cache: SessionCache = connection.app.state.session_cache
+        session: Union[Session, None] = cache.session(token) if token != "null" else None
+        if session == None and token != "null":
+            session = await Session.aload_id(connection.app.state.db, token)
+            if session:
+                cache.put_session(session)
+        connection.state.session = session
+    return connection.state.session
+
+async def connection_user(connection: ASGIConnection) -> Union[UserConfigEntry, None]:
+    if not "user" in connection.state:
+        session = await connection_session(connection)
+        cache: SessionCache = connection.app.state.session_cache
+        user: Union[UserConfigEntry, None] = cache.user(session.uid) if session and session.uid else None
+        if user == None and session and session.uid:
+            user = await session.auser()
+            if user:
+                cache.put_user(user)
+        connection.state.user = user
+    return connection.state.user
+
+async def guard_hasSession(connection: ASGIConnection, _: BaseRouteHandler) -> None:
     if not "Authorization" in connection.headers.keys():
         raise ValidationException(construct_detail("auth.session.not_present", message="Authorization header is required but not included."))
     if connection.headers["Authorization"] == "null":
         raise PermissionDeniedException(construct_detail("auth.session.empty", message="A session token is required to access this endpoint."))
-    session: Session = Session.load_id(connection.app.state.db, connection.headers["Authorization"])
+    session = await connection_session(connection)
     if session == None:
         raise NotAuthorizedException(construct_detail("auth.session.invalid", message="Invalid session token."))
     if not session.active:
-        session.destroy()
+        connection.app.state.session_cache.invalidate_session(session.id)
+        await session.adestroy()
         raise NotAuthorizedException(construct_detail("auth.session.invalid", message="Invalid session token."))
-    session.update()
+    if session.touch():
+        await connection.app.state.session_buffer.put(session)
 
-def guard_loggedIn(connection: ASGIConnection, _: BaseRouteHandler) -> None:
-    session: Session = Session.load_id(connection.app.state.db, connection.headers["Authorization"])
-    if not session.uid:
+async def guard_loggedIn(connection: ASGIConnection, _: BaseRouteHandler) -> None:
+    session = await connection_session(connection)
+    if not session or not session.uid:
         raise NotAuthorizedException(construct_detail("auth.user.logged_out", message="You must be logged in to access this endpoint."))
     
-def guard_has_permission(connection: ASGIConnection, handler: BaseRouteHandler) -> None:
-    session: Session = Session.load_id(connection.app.state.db, connection.headers["Authorization"])
-    if not session.uid:
+async def guard_has_permission(connection: ASGIConnection, handler: BaseRouteHandler) -> None:
+    user = await connection_user(connection)
+    if not user:
         raise NotAuthorizedException(construct_detail("auth.user.logged_out", message="You must be logged in to access this endpoint."))
-    user: UserConfigEntry = session.user
     scope: str = handler.opt.get("scope", None)
     if not scope:
         raise InternalServerException(construct_detail("auth.permission.server_error", "Invalid server configuration."))
@@ -36,4 +65,10 @@ def guard_has_permission(connection: ASGIConnection, handler: BaseRouteHandler)
 
 def guard_ha_active(connection: ASGIConnection, _: BaseRouteHandler) -> None:
     if not connection.app.state.home_assistant:
-        raise MethodNotAllowedException(construct_detail("ha.not_initialized", message="Home Assistant is not initialized"))
\ No newline at end of file
+        raise MethodNotAllowedException(construct_detail("ha.not_initialized", message="Home Assistant is not initialized"))
+def login_throttled(wait: float) -> TooManyRequestsException:
+    retry_after = str(math.ceil(wait))
+    return TooManyRequestsException(
+        construct_detail("auth.login.throttled", message="Too many login attempts, try again later.", data={"retry_after": retry_after}),
+        headers={"Retry-After": retry_after},
+    )
@@ -0,0 +1,49 @@
+from typing import Any, Union
+import os
+import time
+
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", 30))  # Seconds a loaded session or user is reused
+SESSION_CACHE_SIZE = 10000  # Expired entries are pruned once this many are held
+
+
+class SessionCache:
+    # Models are held as Any since util is imported before models
+    def __init__(self, ttl: float = SESSION_CACHE_TTL, size: int = SESSION_CACHE_SIZE):
+        self.ttl = ttl
+        self.size = size
+        self.sessions: dict[str, tuple[float, Any]] = {}
+        self.users: dict[str, tuple[float, Any]] = {}
+
+    def lookup(self, entries: dict[str, tuple[float, Any]], key: str) -> Union[Any, None]:
+        entry = entries.get(key, None)
+        if entry == None:
+            return None
+        if entry[0] < time.monotonic():
+            del entries[key]
+            return None
+        return entry[1]
+
+    def store(self, entries: dict[str, tuple[float, Any]], key: str, value: Any):
+        now = time.monotonic()
+        if len(entries) >= self.size:
+            for expired in [k for k, (expires, _) in entries.items() if expires < now]:
+                del entries[expired]
+        entries[key] = (now + self.ttl, value)
+
+    def session(self, token: str) -> Union[Any, None]:
+        return self.lookup(self.sessions, token)
+
+    def put_session(self, session: Any):
+        self.store(self.sessions, session.id, session)
+
+    def invalidate_session(self, token: str):
+        self.sessions.pop(token, None)
+
+    def user(self, uid: str) -> Union[Any, None]:
+        return self.lookup(self.users, uid)
+
+    def put_user(self, user: Any):
+        self.store(self.users, user.id, user)
+
+    def invalidate_user(self, uid: str):
+        self.users.pop(uid, None)
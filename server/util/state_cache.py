@@ -0,0 +1,58 @@
+from lowhass import State
+from typing import Any, Union
+from .hass import AsyncHASS, HASSException
+import asyncio
+
+
+class EntityStateCache:
+    def __init__(self):
+        self.entities: dict[str, State] = {}
+        self.ready = False
+        self.syncing = False
+        self.pending: list[dict[str, Any]] = []
+        self.lock = asyncio.Lock()
+
+    def clear(self):
+        self.entities = {}
+        self.ready = False
+
+    def apply(self, data: dict[str, Any]):
+        if self.syncing:
+            self.pending.append(data)
+            return
+        if data["new_state"]:
+            self.entities[data["entity_id"]] = State(**data["new_state"])
+        else:
+            self.entities.pop(data["entity_id"], None)
+
+    async def resync(self, hass: AsyncHASS):
+        async with self.lock:
+            self.syncing = True
+            try:
+                states = await hass.rest.get_states()
+            except:
+                self.pending = []
+                raise
+            finally:
+                self.syncing = False
+            pending = self.pending
+            self.pending = []
+            self.entities = {state.entity_id: state for state in states}
+            self.ready = True
+            for data in pending:
+                self.apply(data)
+
+    async def states(self, hass: AsyncHASS) -> list[State]:
+        if not self.ready:
+            await self.resync(hass)
+        return list(self.entities.values())
+
+    async def state(self, hass: AsyncHASS, entity_id: str) -> State:
+        if not self.ready:
+            await self.resync(hass)
+        if not entity_id in self.entities:
+            raise HASSException(404, "Not Found", f"Entity not found: {entity_id}")
+        return self.entities[entity_id]
+
+    def get(self, entity_id: str) -> Union[State, None]:
+        return self.entities.get(entity_id, None)
@@ -0,0 +1,87 @@
+from litestar.channels import ChannelsPlugin
+from typing import Any, Union
+from .eventResponse import publish_event
+from .event_log import LoggedEvent, event_log
+from .topics import topic_index
+import asyncio
+import logging
+import os
+
+STATE_FRAME_RATE = float(os.getenv("STATE_FRAME_RATE", 4))  # State frames sent per second
+
+
+def state_diff(entity_id: str, previous: Union[dict[str, Any], None], current: Union[dict[str, Any], None]) -> Union[dict[str, Any], None]:
+    # Only what changed since the last frame; None when nothing did
+    if current == None:
+        return None if previous == None else {"entity_id": entity_id, "removed": True}
+    previous = previous if previous else {}
+    diff: dict[str, Any] = {"entity_id": entity_id}
+    if current.get("state") != previous.get("state"):
+        diff["state"] = current.get("state")
+    old_attributes: dict[str, Any] = previous.get("attributes", {})
+    new_attributes: dict[str, Any] = current.get("attributes", {})
+    changed = {key: value for key, value in new_attributes.items() if not key in old_attributes or old_attributes[key] != value}
+    if len(changed) > 0:
+        diff["attributes"] = changed
+    unset = [key for key in old_attributes.keys() if not key in new_attributes]
+    if len(unset) > 0:
+        diff["unset"] = unset
+    return diff if len(diff) > 1 else None
+
+
+class StateFrames:
+    # Coalesces state_changed events so each entity is sent at most once per
+    # frame, as a diff against the state sent in the previous frame.
+    def __init__(self, channels: ChannelsPlugin, frame_rate: float = STATE_FRAME_RATE):
+        self.channels = channels
+        self.interval = 1 / frame_rate
+        self.latest: dict[str, Union[dict[str, Any], None]] = {}  # Entity -> newest state since the last frame
+        self.sent: dict[str, dict[str, Any]] = {}  # Entity -> state as of the last frame
+        self.wakeup = asyncio.Event()
+        self.closed = False
+
+    def put(self, entity_id: str, new_state: Union[dict[str, Any], None]):
+        self.latest[entity_id] = new_state
+        self.wakeup.set()
+
+    def frame(self) -> list[dict[str, Any]]:
+        latest = self.latest
+        self.latest = {}
+        diffs = []
+        for entity_id, state in latest.items():
+            diff = state_diff(entity_id, self.sent.get(entity_id, None), state)
+            if state == None:
+                self.sent.pop(entity_id, None)
+            else:
+                self.sent[entity_id] = state
+            if diff:
+                diffs.append(diff)
+        return diffs
+
+    def flush(self):
+        # One message per channel, so pattern subscribers get a single frame too
+        diffs = self.frame()
+        if len(diffs) == 0:
+            return
+        event_id = event_log.next_id()
+        event_log.append(LoggedEvent(event_id, "states", "states", [(diff["entity_id"], diff) for diff in diffs], field="entities"))
+        routed: dict[str, list[dict[str, Any]]] = {}
+        for diff in diffs:
+            for channel in topic_index.channels("states", diff["entity_id"]):
+                routed.setdefault(channel, []).append(diff)
+        for channel, channel_diffs in routed.items():
+            publish_event(self.channels, event_id, "states", {"entities": channel_diffs}, [channel])
+
+    async def run(self):
+        while not self.closed:
+            await self.wakeup.wait()
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except:
+                logging.exception("Failed to send state frame:\n")
+            await asyncio.sleep(self.interval)
+
+    def close(self):
+        self.closed = True
+        self.wakeup.set()
@@ -1,19 +1,33 @@
 from typing import Any, Union
-from pymongo.database import Database
-from pymongo.collection import Collection
-from lowhass import HASS
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.asynchronous.collection import AsyncCollection
+from .hass import AsyncHASS
+from .state_cache import EntityStateCache
+from .view_cache import ViewCache
+from .view_index import ViewIndex
+from .session_cache import SessionCache
+from .login_throttle import LoginThrottle
+from .write_buffer import WriteBuffer
 from litestar.datastructures import State
 
 
 class AppState:
     def __init__(self, data: dict[str, Any]):
-        self.db: Union[Database, None] = data.get("db", None)
-        self.home_assistant: Union[HASS, None] = data.get(
+        self.db: Union[AsyncDatabase, None] = data.get("db", None)
+        self.home_assistant: Union[AsyncHASS, None] = data.get(
             "home_assistant", None
         )
+        self.entity_states: Union[EntityStateCache, None] = data.get(
+            "entity_states", None
+        )
+        self.view_cache: Union[ViewCache, None] = data.get("view_cache", None)
+        self.view_index: Union[ViewIndex, None] = data.get("view_index", None)
+        self.session_cache: Union[SessionCache, None] = data.get("session_cache", None)
+        self.session_buffer: Union[WriteBuffer, None] = data.get("session_buffer", None)
+        self.login_throttle: Union[LoginThrottle, None] = data.get("login_throttle", None)
 
-    def collection(self, name: str) -> Collection:
-        if self.db:
+    def collection(self, name: str) -> AsyncCollection:
+        if self.db is not None:
             return self.db[name]
         else:
             raise RuntimeError("DB not initialized")
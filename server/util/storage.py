@@ -0,0 +1,622 @@
+from bson import ObjectId, json_util
+from pymongo import AsyncMongoClient, DeleteMany, DeleteOne, IndexModel, InsertOne, MongoClient, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.database import Database
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from typing import Any, AsyncIterator, Callable, Iterable, Iterator, Union
+from .query import MISSING, copy_document, freeze, get_path, match, project, run_pipeline, sort_documents, upsert_document, apply_update
+import asyncio
+import os
+import sqlite3
+import threading
+
+# Storage backends expose the pymongo collection API subset the models use.
+# "mongo" connects to MONGO_ADDR; "memory" keeps documents in process and
+# "sqlite" does the same but writes every change through to STORAGE_PATH.
+# Memory collections evaluate queries with util/query.py, so any operator or
+# pipeline stage a model starts using has to be added there as well.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mongo")
+STORAGE_PATH = os.getenv("STORAGE_PATH", "ham.sqlite3")
+
+
+class MemoryResult:
+    def __init__(self, **values):
+        self.acknowledged = True
+        for name, value in values.items():
+            setattr(self, name, value)
+
+
+class MemoryIndex:
+    def __init__(self, name: str, keys: list[tuple[str, int]], **options):
+        self.name = name
+        self.keys = keys
+        self.options = options
+        self.entries: dict[Any, set[str]] = {}  # Leading key value -> document keys
+        self.unique_entries: dict[tuple, str] = {}  # Full key -> document key, unique indexes only
+
+    @classmethod
+    def from_model(cls, model: IndexModel) -> "MemoryIndex":
+        document = dict(model.document)
+        return cls(document.pop("name"), list(document.pop("key").items()), **document)
+
+    @property
+    def unique(self) -> bool:
+        return self.options.get("unique", False)
+
+    def info(self) -> dict[str, Any]:
+        return {"v": 2, "key": list(self.keys), **self.options}
+
+    def covers(self, document: dict) -> bool:
+        if "partialFilterExpression" in self.options and not match(document, self.options["partialFilterExpression"]):
+            return False
+        return not self.options.get("sparse", False) or any(get_path(document, field) is not MISSING for field, _ in self.keys)
+
+    def leading_values(self, document: dict) -> set[Any]:
+        value = get_path(document, self.keys[0][0])
+        return {freeze(value), *(freeze(item) for item in value)} if isinstance(value, list) else {freeze(value)}
+
+    def unique_key(self, document: dict) -> tuple:
+        return tuple(freeze(get_path(document, field)) for field, _ in self.keys)
+
+    def check(self, key: str, document: dict):
+        if self.unique and self.covers(document) and self.unique_entries.get(self.unique_key(document), key) != key:
+            raise DuplicateKeyError(
+                f"E11000 duplicate key error index: {self.name}",
+                11000,
+                {"code": 11000, "keyPattern": dict(self.keys), "errmsg": f"duplicate key on {self.name}"},
+            )
+
+    def add(self, key: str, document: dict):
+        if not self.covers(document):
+            return
+        for value in self.leading_values(document):
+            self.entries.setdefault(value, set()).add(key)
+        if self.unique:
+            self.unique_entries[self.unique_key(document)] = key
+
+    def remove(self, key: str, document: dict):
+        if not self.covers(document):
+            return
+        for value in self.leading_values(document):
+            keys = self.entries.get(value, set())
+            keys.discard(key)
+            if len(keys) == 0:
+                self.entries.pop(value, None)
+        if self.unique and self.unique_entries.get(self.unique_key(document), None) == key:
+            del self.unique_entries[self.unique_key(document)]
+
+    def lookup(self, query: dict) -> Union[set[str], None]:
+        # Document keys that can match an equality or $in condition on the leading field
+        if "partialFilterExpression" in self.options or self.options.get("sparse", False):
+            return None
+        condition = query.get(self.keys[0][0], MISSING)
+        if condition is MISSING:
+            return None
+        if isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+            if "$eq" in condition:
+                values = [condition["$eq"]]
+            elif "$in" in condition:
+                values = condition["$in"]
+            else:
+                return None
+        else:
+            values = [condition]
+        return set().union(*(self.entries.get(freeze(value), set()) for value in values))
+
+
+class MemoryCursor:
+    def __init__(self, source: Callable[[], Iterable[dict]]):
+        self.source = source
+        self.order: list[tuple[str, int]] = []
+        self.skipped = 0
+        self.limited = 0
+
+    def sort(self, key_or_list: Union[str, list[tuple[str, int]]], direction: int = 1) -> "MemoryCursor":
+        self.order = [(key_or_list, direction)] if isinstance(key_or_list, str) else list(key_or_list)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self.skipped = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self.limited = limit
+        return self
+
+    def __iter__(self) -> Iterator[dict]:
+        documents = self.source()
+        if len(self.order) > 0:
+            documents = sort_documents(documents, self.order)
+        for index, document in enumerate(documents):
+            if index < self.skipped:
+                continue
+            if self.limited > 0 and index >= self.skipped + self.limited:
+                break
+            yield document
+
+    def to_list(self, length: Union[int, None] = None) -> list[dict]:
+        documents = list(self)
+        return documents[:length] if length else documents
+
+
+class AsyncMemoryCursor:
+    def __init__(self, store: "MemoryStore", cursor: MemoryCursor):
+        self.store = store
+        self.cursor = cursor
+
+    def sort(self, key_or_list: Union[str, list[tuple[str, int]]], direction: int = 1) -> "AsyncMemoryCursor":
+        self.cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "AsyncMemoryCursor":
+        self.cursor.skip(skip)
+        return self
+
+    def limit(self, limit: int) -> "AsyncMemoryCursor":
+        self.cursor.limit(limit)
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[dict]:
+        # Results are gathered under the lock at once, since writes may change the documents between batches
+        for document in await self.to_list():
+            yield document
+
+    async def to_list(self, length: Union[int, None] = None) -> list[dict]:
+        return await asyncio.to_thread(self.store.locked, self.cursor.to_list, length)
+
+
+class MemoryCollection:
+    def __init__(self, store: "MemoryStore", database: str, name: str):
+        self.store = store
+        self.database = database
+        self.name = name
+        self.documents: dict[str, dict] = {}  # Insertion ordered, keyed by str(_id)
+        self.positions: dict[str, int] = {}  # Insertion sequence, to return indexed matches in natural order
+        self.inserted = 0
+        self.indexes: dict[str, MemoryIndex] = {}
+        self.pending: Union[tuple[list[str], list[str]], None] = None  # Keys written/removed by the running bulk_write
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.database}.{self.name}"
+
+    def index_keys(self, query: dict) -> Union[set[str], None]:
+        # Keys of the documents an index narrows the query to, None when a scan is needed
+        if "_id" in query and not isinstance(query["_id"], dict):
+            return {str(query["_id"])}
+        if "$or" in query:
+            branches = [self.index_keys(branch) for branch in query["$or"]]
+            if all(branch != None for branch in branches):
+                return set().union(*branches)
+        best = None
+        for index in self.indexes.values():
+            keys = index.lookup(query)
+            if keys != None and (best == None or len(keys) < len(best)):
+                best = keys
+        return best
+
+    def candidate_keys(self, query: dict) -> list[str]:
+        keys = self.index_keys(query)
+        if keys == None:
+            return list(self.documents.keys())
+        return sorted((key for key in keys if key in self.positions), key=self.positions.__getitem__)
+
+    def matching(self, query: Union[dict, None]) -> Iterable[dict]:
+        query = query if query else {}
+        for key in self.candidate_keys(query):
+            document = self.documents.get(key, None)
+            if document != None and match(document, query):
+                yield document
+
+    def first_match(self, query: Union[dict, None], sort: Union[list[tuple[str, int]], None] = None) -> Union[dict, None]:
+        documents = self.matching(query)
+        if sort:
+            documents = sort_documents(documents, sort)
+        return next(iter(documents), None)
+
+    def check_indexes(self, key: str, document: dict):
+        for index in self.indexes.values():
+            index.check(key, document)
+
+    def store_document(self, document: dict, previous: Union[dict, None] = None) -> str:
+        key = str(document["_id"])
+        self.check_indexes(key, document)
+        if previous != None:
+            for index in self.indexes.values():
+                index.remove(key, previous)
+        if not key in self.positions:
+            self.positions[key] = self.inserted
+            self.inserted += 1
+        self.documents[key] = document
+        for index in self.indexes.values():
+            index.add(key, document)
+        return key
+
+    def persist(self, keys: list[str], removed: list[str] = []):
+        # Inside bulk_write, changes are collected and committed once when it finishes
+        if self.pending != None:
+            self.pending[0].extend(keys)
+            self.pending[1].extend(removed)
+            return
+        self.store.persist(self, keys, removed)
+
+    def persist_pending(self):
+        keys, removed = self.pending
+        self.pending = None
+        self.store.persist(
+            self,
+            [key for key in dict.fromkeys(keys) if key in self.documents],
+            [key for key in dict.fromkeys(removed) if not key in self.documents],
+        )
+
+    def discard_document(self, key: str):
+        document = self.documents.pop(key)
+        del self.positions[key]
+        for index in self.indexes.values():
+            index.remove(key, document)
+
+    def insert(self, document: dict) -> Any:
+        if not "_id" in document:
+            document["_id"] = ObjectId()
+        if str(document["_id"]) in self.documents:
+            raise DuplicateKeyError("E11000 duplicate key error index: _id_", 11000, {"code": 11000, "keyPattern": {"_id": 1}})
+        self.store_document(copy_document(document))
+        return document["_id"]
+
+    def write_update(self, document: dict, update: dict, replace: bool) -> bool:
+        changed = copy_document(update) if replace else copy_document(document)
+        if replace:
+            changed["_id"] = document["_id"]
+        else:
+            apply_update(changed, update)
+        if changed == document:
+            return False
+        self.store_document(changed, document)
+        return True
+
+    def upsert(self, query: dict, update: dict, replace: bool) -> Any:
+        document = copy_document(update) if replace else upsert_document(query, update)
+        if "_id" in query and not isinstance(query["_id"], dict):
+            document.setdefault("_id", query["_id"])
+        return self.insert(document)
+
+    def update(self, query: dict, update: dict, upsert: bool, multi: bool, replace: bool) -> tuple[int, int, Any]:
+        targets = list(self.matching(query))
+        targets = targets if multi else targets[:1]
+        modified = [self.write_update(document, update, replace) for document in targets]
+        upserted = self.upsert(query, update, replace) if upsert and len(targets) == 0 else None
+        self.persist([str(document["_id"]) for document, changed in zip(targets, modified) if changed] + ([str(upserted)] if upserted != None else []))
+        return len(targets), sum(modified), upserted
+
+    def find(
+        self,
+        filter: Union[dict, None] = None,
+        projection: Union[dict, None] = None,
+        sort: Union[list[tuple[str, int]], None] = None,
+        limit: int = 0,
+        skip: int = 0,
+        **kwargs,
+    ) -> MemoryCursor:
+        cursor = MemoryCursor(lambda: (project(document, projection if projection else {}) for document in self.matching(filter)))
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter: Union[dict, None] = None, projection: Union[dict, None] = None, sort: Union[list[tuple[str, int]], None] = None, **kwargs) -> Union[dict, None]:
+        document = self.first_match(filter, sort)
+        return project(document, projection if projection else {}) if document != None else None
+
+    def count_documents(self, filter: dict, **kwargs) -> int:
+        return sum(1 for _ in self.matching(filter))
+
+    def pipeline_source(self, pipeline: list[dict]) -> tuple[Iterable[dict], list[dict]]:
+        # A leading $match is answered from the indexes instead of scanning every document
+        if len(pipeline) > 0 and "$match" in pipeline[0]:
+            return (copy_document(document) for document in self.matching(pipeline[0]["$match"])), pipeline[1:]
+        return (copy_document(document) for document in self.matching({})), pipeline
+
+    def run(self, pipeline: list[dict]) -> Iterable[dict]:
+        documents, stages = self.pipeline_source(pipeline)
+        return run_pipeline(documents, stages, lambda name, stages: self.store.collection(self.database, name).run(stages))
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> MemoryCursor:
+        return MemoryCursor(lambda: self.run(pipeline))
+
+    def insert_one(self, document: dict, **kwargs) -> MemoryResult:
+        inserted = self.insert(document)
+        self.persist([str(inserted)])
+        return MemoryResult(inserted_id=inserted)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> MemoryResult:
+        result = self.bulk_write([InsertOne(document) for document in documents], ordered=ordered)
+        return MemoryResult(inserted_ids=result.inserted_ids)
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False, **kwargs) -> MemoryResult:
+        matched, modified, upserted = self.update(filter, replacement, upsert, multi=False, replace=True)
+        return MemoryResult(matched_count=matched, modified_count=modified, upserted_id=upserted)
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> MemoryResult:
+        matched, modified, upserted = self.update(filter, update, upsert, multi=False, replace=False)
+        return MemoryResult(matched_count=matched, modified_count=modified, upserted_id=upserted)
+
+    def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> MemoryResult:
+        matched, modified, upserted = self.update(filter, update, upsert, multi=True, replace=False)
+        return MemoryResult(matched_count=matched, modified_count=modified, upserted_id=upserted)
+
+    def delete(self, query: dict, multi: bool) -> int:
+        targets = [str(document["_id"]) for document in self.matching(query)]
+        targets = targets if multi else targets[:1]
+        for key in targets:
+            self.discard_document(key)
+        self.persist([], targets)
+        return len(targets)
+
+    def delete_one(self, filter: dict, **kwargs) -> MemoryResult:
+        return MemoryResult(deleted_count=self.delete(filter, multi=False))
+
+    def delete_many(self, filter: dict, **kwargs) -> MemoryResult:
+        return MemoryResult(deleted_count=self.delete(filter, multi=True))
+
+    def write_requests(self, requests: list[Any], ordered: bool, details: dict[str, Any], inserted_ids: list[Any]):
+        for index, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    inserted_ids.append(self.insert(request._doc))
+                    self.persist([str(inserted_ids[-1])])
+                    details["nInserted"] += 1
+                    continue
+                if isinstance(request, (DeleteOne, DeleteMany)):
+                    details["nRemoved"] += self.delete(request._filter, multi=isinstance(request, DeleteMany))
+                    continue
+                if not isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    raise OperationFailure(f"unsupported bulk operation: {type(request).__name__}")
+                matched, modified, upserted = self.update(
+                    request._filter,
+                    request._doc,
+                    request._upsert,
+                    multi=isinstance(request, UpdateMany),
+                    replace=isinstance(request, ReplaceOne),
+                )
+                details["nMatched"] += matched
+                details["nModified"] += modified
+                if upserted != None:
+                    details["nUpserted"] += 1
+                    details["upserted"].append({"index": index, "_id": upserted})
+            except DuplicateKeyError as exc:
+                details["writeErrors"].append({"index": index, "code": exc.code, "errmsg": str(exc), "op": request})
+                if ordered:
+                    break
+
+    def bulk_write(self, requests: list[Any], ordered: bool = True, **kwargs) -> MemoryResult:
+        details = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": [], "writeErrors": []}
+        inserted_ids = []
+        self.pending = ([], [])
+        try:
+            self.write_requests(requests, ordered, details, inserted_ids)
+        finally:
+            self.persist_pending()
+        if len(details["writeErrors"]) > 0:
+            raise BulkWriteError(details)
+        return MemoryResult(
+            inserted_ids=inserted_ids,
+            inserted_count=details["nInserted"],
+            matched_count=details["nMatched"],
+            modified_count=details["nModified"],
+            deleted_count=details["nRemoved"],
+            upserted_count=details["nUpserted"],
+            upserted_ids={item["index"]: item["_id"] for item in details["upserted"]},
+        )
+
+    def index_information(self) -> dict[str, dict[str, Any]]:
+        return {"_id_": {"v": 2, "key": [("_id", 1)]}, **{name: index.info() for name, index in self.indexes.items()}}
+
+    def add_index(self, index: MemoryIndex):
+        for key, document in self.documents.items():
+            try:
+                index.check(key, document)
+            except DuplicateKeyError as exc:
+                raise OperationFailure(f"cannot create index {index.name}: {exc}", 11000)
+            index.add(key, document)
+        self.indexes[index.name] = index
+
+    def create_indexes(self, indexes: list[IndexModel], **kwargs) -> list[str]:
+        names = []
+        for model in indexes:
+            index = MemoryIndex.from_model(model)
+            if index.name in self.indexes:
+                if self.indexes[index.name].info() != index.info():
+                    raise OperationFailure(f"an index named {index.name} already exists with different options", 86)
+            else:
+                self.add_index(index)
+                self.store.persist_index(self, index)
+            names.append(index.name)
+        return names
+
+
+class AsyncMemoryCollection:
+    # Memory and SQLite work runs in a worker thread so aggregations and
+    # commits don't stall the event loop; the store lock serializes it.
+    def __init__(self, collection: MemoryCollection):
+        self.collection = collection
+        self.name = collection.name
+        self.full_name = collection.full_name
+
+    async def call(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        return await asyncio.to_thread(self.collection.store.locked, method, *args, **kwargs)
+
+    def find(self, *args, **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self.collection.store, self.collection.find(*args, **kwargs))
+
+    async def aggregate(self, pipeline: list[dict], **kwargs) -> AsyncMemoryCursor:
+        return AsyncMemoryCursor(self.collection.store, self.collection.aggregate(pipeline, **kwargs))
+
+    async def find_one(self, *args, **kwargs) -> Union[dict, None]:
+        return await self.call(self.collection.find_one, *args, **kwargs)
+
+    async def count_documents(self, *args, **kwargs) -> int:
+        return await self.call(self.collection.count_documents, *args, **kwargs)
+
+    async def insert_one(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.insert_one, *args, **kwargs)
+
+    async def insert_many(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.insert_many, *args, **kwargs)
+
+    async def replace_one(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.replace_one, *args, **kwargs)
+
+    async def update_one(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.update_one, *args, **kwargs)
+
+    async def update_many(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.update_many, *args, **kwargs)
+
+    async def delete_one(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.delete_one, *args, **kwargs)
+
+    async def delete_many(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.delete_many, *args, **kwargs)
+
+    async def bulk_write(self, *args, **kwargs) -> MemoryResult:
+        return await self.call(self.collection.bulk_write, *args, **kwargs)
+
+    async def index_information(self) -> dict[str, dict[str, Any]]:
+        return await self.call(self.collection.index_information)
+
+    async def create_indexes(self, *args, **kwargs) -> list[str]:
+        return await self.call(self.collection.create_indexes, *args, **kwargs)
+
+
+class MemoryStore:
+    def __init__(self, path: Union[str, None] = None):
+        self.collections: dict[tuple[str, str], MemoryCollection] = {}
+        self.lock = threading.RLock()
+        self.connection = None
+        if path:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS documents (db TEXT, collection TEXT, key TEXT, body TEXT, PRIMARY KEY (db, collection, key))"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS indexes (db TEXT, collection TEXT, name TEXT, spec TEXT, PRIMARY KEY (db, collection, name))"
+            )
+            self.connection.commit()
+            self.restore()
+
+    def restore(self):
+        for database, name, index_name, spec in self.connection.execute("SELECT db, collection, name, spec FROM indexes"):
+            options = json_util.loads(spec)
+            options.pop("v", None)
+            self.collection(database, name).indexes[index_name] = MemoryIndex(index_name, [tuple(key) for key in options.pop("key")], **options)
+        for database, name, key, body in self.connection.execute("SELECT db, collection, key, body FROM documents ORDER BY rowid"):
+            self.collection(database, name).store_document(json_util.loads(body))
+
+    def locked(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        with self.lock:
+            return method(*args, **kwargs)
+
+    def collection(self, database: str, name: str) -> MemoryCollection:
+        if not (database, name) in self.collections:
+            self.collections[(database, name)] = MemoryCollection(self, database, name)
+        return self.collections[(database, name)]
+
+    def persist(self, collection: MemoryCollection, keys: list[str], removed: list[str] = []):
+        if self.connection == None or len(keys) + len(removed) == 0:
+            return
+        with self.lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO documents (db, collection, key, body) VALUES (?, ?, ?, ?)",
+                [(collection.database, collection.name, key, json_util.dumps(collection.documents[key])) for key in keys],
+            )
+            self.connection.executemany(
+                "DELETE FROM documents WHERE db = ? AND collection = ? AND key = ?",
+                [(collection.database, collection.name, key) for key in removed],
+            )
+            self.connection.commit()
+
+    def persist_index(self, collection: MemoryCollection, index: MemoryIndex):
+        if self.connection == None:
+            return
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO indexes (db, collection, name, spec) VALUES (?, ?, ?, ?)",
+                (collection.database, collection.name, index.name, json_util.dumps(index.info())),
+            )
+            self.connection.commit()
+
+    def close(self):
+        if self.connection != None:
+            self.connection.close()
+            self.connection = None
+
+
+class MemoryDatabase:
+    def __init__(self, store: MemoryStore, name: str):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.store.collection(self.name, name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class AsyncMemoryDatabase:
+    def __init__(self, store: MemoryStore, name: str):
+        self.store = store
+        self.name = name
+
+    def __getitem__(self, name: str) -> AsyncMemoryCollection:
+        return AsyncMemoryCollection(self.store.collection(self.name, name))
+
+    def __getattr__(self, name: str) -> AsyncMemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+
+class MemoryClient:
+    def __init__(self, path: Union[str, None] = None):
+        self.store = MemoryStore(path)
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return MemoryDatabase(self.store, name)
+
+    def close(self):
+        self.store.close()
+
+
+class AsyncMemoryClient:
+    def __init__(self, path: Union[str, None] = None):
+        self.store = MemoryStore(path)
+
+    def __getitem__(self, name: str) -> AsyncMemoryDatabase:
+        return AsyncMemoryDatabase(self.store, name)
+
+    async def close(self):
+        self.store.close()
+
+
+StorageDatabase = Union[Database, MemoryDatabase]
+AsyncStorageDatabase = Union[AsyncDatabase, AsyncMemoryDatabase]
+
+
+def storage_client(backend: str = STORAGE_BACKEND) -> Union[MongoClient, MemoryClient]:
+    if backend == "memory":
+        return MemoryClient()
+    if backend == "sqlite":
+        return MemoryClient(STORAGE_PATH)
+    return MongoClient(os.getenv("MONGO_ADDR"))
+
+
+def async_storage_client(backend: str = STORAGE_BACKEND) -> Union[AsyncMongoClient, AsyncMemoryClient]:
+    if backend == "memory":
+        return AsyncMemoryClient()
+    if backend == "sqlite":
+        return AsyncMemoryClient(STORAGE_PATH)
+    return AsyncMongoClient(os.getenv("MONGO_ADDR"))
@@ -0,0 +1,90 @@
+from fnmatch import fnmatchcase
+from typing import Union
+
+# Clients subscribe to "topic" for every event of a kind, or "topic:pattern"
+# for the events whose key (entity id, view id) matches a glob pattern.
+EVENT_TOPICS = ["states", "ha_status", "data", "view_data", "views", "entity.tracked"]
+
+
+def is_pattern(spec: str) -> bool:
+    return "|" in spec or any(char in spec for char in "*?[")
+
+
+def subscription_channels(topics: list[str]) -> list[str]:
+    # One channel per topic and client where possible, so no event is delivered twice
+    everything: set[str] = set()
+    wanted: dict[str, set[str]] = {}
+    for spec in topics:
+        topic, _, pattern = spec.strip().partition(":")
+        if not topic in EVENT_TOPICS:
+            raise ValueError(f"Unknown event topic: {topic}")
+        if pattern in ("", "*"):
+            everything.add(topic)
+        else:
+            wanted.setdefault(topic, set()).add(pattern)
+    channels = []
+    for topic in EVENT_TOPICS:
+        if topic in everything:
+            channels.append(topic)
+            continue
+        patterns = wanted.get(topic, set())
+        wildcards = sorted(pattern for pattern in patterns if is_pattern(pattern))
+        channels.extend(
+            f"{topic}:{key}"
+            for key in sorted(patterns)
+            if not is_pattern(key) and not any(fnmatchcase(key, wildcard) for wildcard in wildcards)
+        )
+        if len(wildcards) > 0:
+            channels.append(f"{topic}:{'|'.join(wildcards)}")
+    return channels
+
+
+def channel_matches(channel: str, topic: str, key: Union[str, None] = None) -> bool:
+    channel_topic, _, spec = channel.partition(":")
+    if channel_topic != topic:
+        return False
+    if not spec:
+        return True
+    if key == None:
+        return False
+    return any(fnmatchcase(key, pattern) for pattern in spec.split("|")) if is_pattern(spec) else spec == key
+
+
+class TopicIndex:
+    # Keyed channels that currently have subscribers; events are only
+    # published to the channels someone is listening on.
+    def __init__(self):
+        self.exact: dict[str, dict[str, int]] = {}  # Topic -> key -> subscriptions
+        self.patterns: dict[str, dict[str, int]] = {}  # Topic -> "glob|glob" -> subscriptions
+
+    def add(self, channels: list[str]):
+        for channel in channels:
+            topic, _, spec = channel.partition(":")
+            if spec:
+                counts = (self.patterns if is_pattern(spec) else self.exact).setdefault(topic, {})
+                counts[spec] = counts.get(spec, 0) + 1
+
+    def remove(self, channels: list[str]):
+        for channel in channels:
+            topic, _, spec = channel.partition(":")
+            if not spec:
+                continue
+            counts = (self.patterns if is_pattern(spec) else self.exact).get(topic, {})
+            if counts.get(spec, 0) > 1:
+                counts[spec] -= 1
+            else:
+                counts.pop(spec, None)
+
+    def channels(self, topic: str, key: Union[str, None] = None) -> list[str]:
+        channels = [topic]
+        if key == None:
+            return channels
+        if key in self.exact.get(topic, {}):
+            channels.append(f"{topic}:{key}")
+        for spec in self.patterns.get(topic, {}).keys():
+            if any(fnmatchcase(key, pattern) for pattern in spec.split("|")):
+                channels.append(f"{topic}:{spec}")
+        return channels
+
+
+topic_index = TopicIndex()
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Union
+import bisect
+import os
+
+VIEW_CACHE_MAX_ROWS = int(os.getenv("VIEW_CACHE_MAX_ROWS", 500000))
+
+
+class CachedRows:
+    def __init__(self, rows: list[dict[str, Any]], end: float):
+        self.rows = rows
+        self.times = [row["time"] for row in rows]
+        self.end = end
+
+    @property
+    def size(self) -> int:
+        return len(self.rows)
+
+    def replace_tail(self, boundary: float, rows: list[dict[str, Any]], end: float):
+        cut = bisect.bisect_left(self.times, boundary)
+        del self.rows[cut:]
+        del self.times[cut:]
+        self.rows.extend(rows)
+        self.times.extend(row["time"] for row in rows)
+        self.end = end
+
+    def trim_head(self, start: float):
+        cut = bisect.bisect_left(self.times, start)
+        del self.rows[:cut]
+        del self.times[:cut]
+
+
+class ViewCache:
+    def __init__(self, max_rows: int = VIEW_CACHE_MAX_ROWS):
+        self.entries: OrderedDict[Hashable, CachedRows] = OrderedDict()
+        self.max_rows = max_rows
+
+    def get(self, key: Hashable) -> Union[CachedRows, None]:
+        if not key in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: Hashable, entry: CachedRows):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        total = sum(cached.size for cached in self.entries.values())
+        while total > self.max_rows and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            total -= evicted.size
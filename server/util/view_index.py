@@ -0,0 +1,50 @@
+from typing import Any
+import logging
+import math
+
+
+class ViewIndex:
+    def __init__(self):
+        self.views: dict[str, Any] = {}
+        self.series: dict[tuple[str, str], set[str]] = {}
+        self.last_buckets: dict[tuple[str, str, str], int] = {}
+
+    def add(self, view: Any):
+        # Read up front so a malformed view fails here, before anything is indexed
+        series = view.series()
+        view.range["resolution"]
+        self.remove(view.id)
+        self.views[view.id] = view
+        for key in series:
+            self.series.setdefault(key, set()).add(view.id)
+
+    def remove(self, view_id: str):
+        self.views.pop(view_id, None)
+        for view_ids in self.series.values():
+            view_ids.discard(view_id)
+        self.last_buckets = {k: v for k, v in self.last_buckets.items() if k[0] != view_id}
+
+    def rebuild(self, views: list[Any]):
+        self.views = {}
+        self.series = {}
+        for view in views:
+            try:
+                self.add(view)
+            except (KeyError, TypeError):
+                logging.exception(f"Skipping malformed view {view.id}:\n")
+
+    def view_updates(self, samples: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+        # Applies each view's resolution to new samples, keeping only the first
+        # sample of every bucket that hasn't been pushed yet.
+        updates: dict[str, list[dict[str, Any]]] = {}
+        for sample in sorted(samples, key=lambda s: s["time"]):
+            for view_id in self.series.get((sample["entity"], sample["field"]), ()):
+                resolution = self.views[view_id].range["resolution"]
+                if resolution > 0:
+                    key = (view_id, sample["entity"], sample["field"])
+                    bucket = math.floor(sample["time"] / resolution)
+                    if self.last_buckets.get(key, None) == bucket:
+                        continue
+                    self.last_buckets[key] = bucket
+                updates.setdefault(view_id, []).append(sample)
+        return updates
@@ -0,0 +1,106 @@
+from pymongo.asynchronous.collection import AsyncCollection
+from pymongo.errors import BulkWriteError, PyMongoError
+from typing import Any, Callable, Union
+from .model import ORM
+import asyncio
+import logging
+import time
+
+FLUSH_SIZE = 500  # Flush once this many documents are queued
+FLUSH_AGE = 5  # Flush documents older than this many seconds
+MAX_PENDING = 20000  # Producers awaiting put() block and add() drops above this many queued documents
+RETRY_DELAY = 2
+DUPLICATE_KEY = 11000
+MAX_RETRIES = 5  # Failed attempts before a flush gives up and leaves the batch for the next one
+
+
+class WriteBuffer:
+    def __init__(
+        self,
+        collection: AsyncCollection,
+        flush_size: int = FLUSH_SIZE,
+        flush_age: float = FLUSH_AGE,
+        max_pending: int = MAX_PENDING,
+        prepare: Callable[[list[dict[str, Any]]], list[Any]] = None,
+    ):
+        self.collection = collection
+        self.flush_size = flush_size
+        self.flush_age = flush_age
+        self.max_pending = max_pending
+        self.prepare = prepare
+        self.pending: list[dict[str, Any]] = []
+        self.oldest: float = 0
+        self.wakeup = asyncio.Event()
+        self.drained = asyncio.Event()
+        self.lock = asyncio.Lock()
+        self.closed = False
+        self.dropped = 0
+
+    def add(self, item: Union[ORM, dict[str, Any]]) -> bool:
+        # Callers that cannot wait lose documents once the buffer is full
+        if len(self.pending) >= self.max_pending:
+            self.dropped += 1
+            self.wakeup.set()
+            return False
+        if len(self.pending) == 0:
+            self.oldest = time.time()
+        self.pending.append(item.to_dict() if isinstance(item, ORM) else item)
+        if len(self.pending) >= self.flush_size:
+            self.wakeup.set()
+        if len(self.pending) >= self.max_pending:
+            self.drained.clear()
+        return True
+
+    async def put(self, item: Union[ORM, dict[str, Any]]):
+        while len(self.pending) >= self.max_pending and not self.closed:
+            self.wakeup.set()
+            await self.drained.wait()
+        self.add(item)
+
+    async def flush(self):
+        async with self.lock:
+            if self.dropped > 0:
+                logging.warning(f"Dropped {self.dropped} documents for {self.collection.name} while the buffer was full")
+                self.dropped = 0
+            failures = 0
+            while len(self.pending) > 0:
+                batch = self.pending[: self.flush_size]
+                self.pending = self.pending[self.flush_size :]
+                self.oldest = time.time()
+                try:
+                    if self.prepare:
+                        await self.collection.bulk_write(self.prepare(batch), ordered=False)
+                    else:
+                        await self.collection.insert_many(batch, ordered=False)
+                except BulkWriteError as exc:
+                    # Duplicate keys are writes an earlier, partly applied attempt already made
+                    dropped = [error for error in exc.details.get("writeErrors", []) if error.get("code", None) != DUPLICATE_KEY]
+                    if len(dropped) > 0:
+                        logging.error(f"Dropped {len(dropped)} documents writing to {self.collection.name}")
+                except PyMongoError:
+                    logging.exception(f"Failed to write to {self.collection.name}, retrying:\n")
+                    self.pending = batch + self.pending
+                    failures += 1
+                    if failures >= MAX_RETRIES or self.closed:
+                        break
+                    await asyncio.sleep(RETRY_DELAY)
+            if len(self.pending) < self.max_pending:
+                self.drained.set()
+
+    async def run(self):
+        while not self.closed:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.flush_age)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            if len(self.pending) >= self.flush_size or (
+                len(self.pending) > 0 and time.time() - self.oldest >= self.flush_age
+            ):
+                await self.flush()
+
+    async def close(self):
+        self.closed = True
+        self.wakeup.set()
+        await self.flush()
+        self.drained.set()